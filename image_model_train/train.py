@@ -1,51 +1,173 @@
+import os
+import hashlib
 import torch
 from torch import nn, optim
-from torchvision import datasets, transforms, models
-from torch.utils.data import DataLoader, random_split
+from torchvision import datasets, models
+from torchvision.transforms import v2
+from torchvision.io import ImageReadMode, decode_jpeg, read_file
+from torch.utils.data import DataLoader, TensorDataset
 from tqdm import tqdm
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+use_cuda = device.type == "cuda"
 
-# 1. 데이터 로드
-transform = transforms.Compose([
-    transforms.Resize((224,224)),
-    transforms.ToTensor()
+# 입력 크기가 224x224로 고정이므로 cuDNN이 가장 빠른 conv 알고리즘을 골라 재사용
+torch.backends.cudnn.benchmark = True
+
+# 혼합 정밀도 (특징 추출): Ampere 이상은 BF16, 그 외 GPU는 FP16
+amp_dtype = torch.bfloat16 if use_cuda and torch.cuda.is_bf16_supported() else torch.float16
+
+# 백본 특징 캐시 (백본이 고정이라 이미지별 특징은 매 epoch 동일)
+FEATURE_CACHE = "train_features.pt"
+# 특징을 만드는 백본 식별자 (바뀌면 캐시 무효화)
+BACKBONE_ID = "resnet18/IMAGENET1K_V1"
+
+# 데이터 로더 워커 수 (CPU 절반 - 나머지는 메인 프로세스/GPU 피딩용)
+NUM_WORKERS = (os.cpu_count() or 2) // 2
+
+# 1. 데이터 전처리 (torchvision v2 - uint8 텐서 상태에서 리사이즈 후 float 변환)
+transform = v2.Compose([
+    v2.ToImage(),
+    v2.Resize((224,224)),
+    v2.ToDtype(torch.float32, scale=True)
 ])
 
-train_dir = "dataset/training_set"
-test_dir = "dataset/test_set"
-
-train_dataset = datasets.ImageFolder(train_dir, transform=transform)
-test_dataset = datasets.ImageFolder(test_dir, transform=transform)
-
-train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True)
-test_loader = DataLoader(test_dataset, batch_size=32)
-
-# 2. 모델 준비
-model = models.resnet18(pretrained=True)
-for param in model.parameters():
-    param.requires_grad = False
-model.fc = nn.Linear(model.fc.in_features,2)
-
-model = model.to(device)
-
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.fc.parameters(), lr=0.001)
-
-# 3. 학습
-for epoch in range(2): # 2 epoch만
-    model.train()
-    running_loss = 0.0
-    for images, labels in tqdm(train_loader):
-        images, labels = images.to(device), labels.to(device)
-        optimizer.zero_grad()
-        outputs = model(images)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-        running_loss += loss.item()
-    print(f"Epoch {epoch+1}, Loss: {running_loss/len(train_loader):.4f}")
-
-torch.save(model.state_dict(), "cats_dogs.pth")
-print("모델 저장 완료")
-    
\ No newline at end of file
+
+# CUDA에서는 PIL 대신 GPU(NVJPEG)로 디코딩 - 워커는 파일 바이트만 읽음
+gpu_transform = v2.Compose([
+    v2.Resize((224,224)),
+    v2.ToDtype(torch.float32, scale=True)
+])
+
+
+class EncodedImageFolder(datasets.ImageFolder):
+    """이미지를 디코딩하지 않고 인코딩된 JPEG 바이트(uint8 텐서)로 반환"""
+
+    def __getitem__(self, index):
+        path, target = self.samples[index]
+        return read_file(path), target
+
+
+def collate_encoded(batch):
+    """크기가 제각각인 인코딩 바이트는 쌓지 않고 리스트로 묶음"""
+    data, targets = zip(*batch)
+    return list(data), torch.tensor(targets)
+
+
+def decode_on_gpu(encoded):
+    """JPEG 바이트 배치를 NVJPEG로 한 번에 디코딩하고 GPU에서 리사이즈"""
+    images = decode_jpeg(encoded, mode=ImageReadMode.RGB, device=device)
+    return torch.stack([gpu_transform(image) for image in images])
+
+
+def feature_fingerprint(dataset, preprocess):
+    """
+    특징 캐시 키 - 샘플(경로, 클래스, mtime, 크기) + 전처리 + 백본 + 정밀도
+    이미지 교체/클래스 폴더 이동/전처리 변경이 있으면 값이 달라짐
+    """
+    h = hashlib.sha256()
+    h.update(f"{BACKBONE_ID}|{preprocess!r}|{amp_dtype if use_cuda else torch.float32}".encode())
+    for path, target in dataset.samples:
+        st = os.stat(path)
+        h.update(f"\n{path}|{target}|{st.st_mtime_ns}|{st.st_size}".encode())
+    return h.hexdigest()
+
+
+def extract_features(model, loader):
+    """고정된 백본(fc 이전까지)을 한 번 통과시켜 512차원 특징과 라벨 반환"""
+    backbone = nn.Sequential(*list(model.children())[:-1]).eval()
+    features, targets = [], []
+    with torch.inference_mode(), torch.autocast(device.type, dtype=amp_dtype, enabled=use_cuda):
+        for images, labels in tqdm(loader, desc="특징 추출"):
+            if isinstance(images, list):
+                images = decode_on_gpu(images)
+            images = images.to(device, memory_format=torch.channels_last, non_blocking=True)
+            features.append(backbone(images).flatten(1).float().cpu())
+            targets.append(labels)
+    return torch.cat(features), torch.cat(targets)
+
+
+def main():
+    train_dir = "dataset/training_set"
+    test_dir = "dataset/test_set"
+
+    if use_cuda:
+        train_dataset = EncodedImageFolder(train_dir)
+    else:
+        train_dataset = datasets.ImageFolder(train_dir, transform=transform)
+    test_dataset = datasets.ImageFolder(test_dir, transform=transform)
+
+    # 특징 추출은 한 번만 순서대로 (셔플은 특징 단계에서)
+    # JPEG 디코딩/리사이즈를 워커 프로세스에서 미리 처리하고 pinned memory로 GPU 복사와 겹침
+    loader_kwargs = dict(
+        batch_size=128,
+        num_workers=NUM_WORKERS,
+        pin_memory=use_cuda,
+        prefetch_factor=4 if NUM_WORKERS else None
+    )
+    feature_loader = DataLoader(
+        train_dataset,
+        collate_fn=collate_encoded if use_cuda else None,
+        **loader_kwargs
+    )
+    test_loader = DataLoader(test_dataset, **loader_kwargs)
+
+    # 2. 모델 준비
+    model = models.resnet18(pretrained=True)
+    for param in model.parameters():
+        param.requires_grad = False
+    model.fc = nn.Linear(model.fc.in_features,2)
+
+    # channels_last(NHWC) - Tensor Core conv에서 레이아웃 변환(permute) 제거
+    model = model.to(device, memory_format=torch.channels_last)
+
+    # 3. 백본 특징 준비 (캐시의 fingerprint가 현재 데이터셋/전처리/백본과 같을 때만 재사용)
+    fingerprint = feature_fingerprint(train_dataset, gpu_transform if use_cuda else transform)
+    cached = torch.load(FEATURE_CACHE) if os.path.exists(FEATURE_CACHE) else None
+    if cached is not None and cached.get("fingerprint") == fingerprint:
+        train_features, train_labels = cached["X"], cached["y"]
+        print(f"특징 캐시 사용: {FEATURE_CACHE}")
+    else:
+        train_features, train_labels = extract_features(model, feature_loader)
+        torch.save({"X": train_features, "y": train_labels, "fingerprint": fingerprint}, FEATURE_CACHE)
+        print(f"특징 캐시 저장: {FEATURE_CACHE}")
+
+    train_loader = DataLoader(TensorDataset(train_features, train_labels), batch_size=128, shuffle=True)
+
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.fc.parameters(), lr=0.001)
+
+    # 4. 학습 (fc만 - 캐시된 특징 위에서 선형 분류기 학습)
+    for epoch in range(2): # 2 epoch만
+        model.fc.train()
+        running_loss = 0.0
+        for features, labels in tqdm(train_loader):
+            features = features.to(device, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
+            optimizer.zero_grad(set_to_none=True)
+            outputs = model.fc(features)
+            loss = criterion(outputs, labels)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item()
+        print(f"Epoch {epoch+1}, Loss: {running_loss/len(train_loader):.4f}")
+
+    # 5. 테스트셋 평가 (백본 + 학습된 fc 전체 통과)
+    model.eval()
+    correct = total = 0
+    with torch.inference_mode(), torch.autocast(device.type, dtype=amp_dtype, enabled=use_cuda):
+        for images, labels in tqdm(test_loader, desc="평가"):
+            images = images.to(device, memory_format=torch.channels_last, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
+            correct += (model(images).argmax(1) == labels).sum().item()
+            total += labels.size(0)
+    print(f"Test Accuracy: {100 * correct / total:.2f}%")
+
+    # 전체 모델(백본 + 학습된 fc) 저장 - app.py에서 그대로 로드
+    torch.save(model.state_dict(), "cats_dogs.pth")
+    print("모델 저장 완료")
+
+
+# DataLoader 워커가 spawn 방식(macOS 기본)으로 이 모듈을 다시 import해도 학습이 재실행되지 않도록
+if __name__ == "__main__":
+    main()
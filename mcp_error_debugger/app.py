@@ -4,15 +4,20 @@ PHP 에러 → FastAPI → LangGraph Agent → 비즈니스 로직 분석
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Annotated, TypedDict
+from dataclasses import dataclass
 import os
 import re
+import string
 from dotenv import load_dotenv
 import json
+import logging
+import httpx
 
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 from langchain_core.tools import tool
@@ -23,806 +28,65 @@ from mcp.client.stdio import stdio_client
 from langchain_mcp_adapters.tools import load_mcp_tools
 import asyncio
 
-# 환경 변수 로드
-load_dotenv()
-
-# LLM 초기화
-llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0.3)
-
-# GitHub 저장소 정보
-GITHUB_REPO_OWNER = os.getenv("GITHUB_REPO_OWNER", "fanding")
-GITHUB_REPO_NAME = os.getenv("GITHUB_REPO_NAME", "legacy-php-api")
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-
-# FastAPI 앱
-app = FastAPI(
-    title="Error Debugger API with LangGraph",
-    description="LangGraph로 체계적인 에러 분석",
-    version="4.0.0"
-)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-# ========== Pydantic Models ==========
-
-class ErrorRequest(BaseModel):
-    error_type: str = Field(..., description="에러 타입")
-    error_message: str = Field(..., description="에러 메시지")
-    stack_trace: str = Field(..., description="전체 스택 트레이스")
-    input_params: Optional[str] = Field(None, description="입력 파라미터")
-    server_base_path: str = Field(
-        default="/Users/fanding/develop/legacy-php-api",
-        description="서버 코드 기본 경로"
-    )
-    git_ref: Optional[str] = Field(
-        default="master",
-        description="Git 브랜치/태그/커밋 (예: master, develop, refs/heads/feature-branch)"
-    )
-
-
-# ========== GitHub MCP Tools ==========
-
-# GitHub MCP 서버 파라미터를 전역으로 저장
-github_mcp_server_params = None
-
-async def initialize_github_mcp():
-    """GitHub MCP 서버 파라미터를 초기화합니다."""
-    global github_mcp_server_params
-
-    if not GITHUB_TOKEN:
-        print("⚠️  GITHUB_TOKEN이 설정되지 않아 GitHub MCP를 사용할 수 없습니다.")
-        return False
-
-    try:
-        # GitHub MCP 서버 설정 (npx 사용)
-        github_mcp_server_params = StdioServerParameters(
-            command="npx",
-            args=["-y", "@modelcontextprotocol/server-github"],
-            env={
-                "GITHUB_PERSONAL_ACCESS_TOKEN": GITHUB_TOKEN
-            }
-        )
-
-        print(f"🔌 GitHub MCP 서버 설정 완료 (repo: {GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME})")
-
-        # 테스트 연결로 도구 목록 확인
-        async with stdio_client(github_mcp_server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                tools = await load_mcp_tools(session)
-                print(f"✅ GitHub MCP 도구 {len(tools)}개 사용 가능")
-                print(f"\n📋 사용 가능한 도구 목록:")
-                for tool in tools[:26]:  # 처음 10개만 출력
-                    print(f"  - {tool.name}: {tool.description[:80] if hasattr(tool, 'description') and tool.description else 'No description'}...")
-               
-                print()
-
-        return True
-    except Exception as e:
-        print(f"❌ GitHub MCP 초기화 실패: {e}")
-        return False
-
-
-# ========== 로컬 파일 도구 제거 ==========
-# GitHub MCP만 사용합니다.
-
-
-# ========== LangGraph State ==========
-
-from operator import add
-
-class AgentState(TypedDict):
-    messages: Annotated[list, add]  # add operator로 메시지 누적
-    error_info: dict
-    error_line: int  # 에러 발생 라인 번호
-    git_ref: str  # Git 브랜치/태그/커밋
-    analysis_result: Optional[str]
-    token_usage: dict  # 토큰 사용량 추적
-
-
-# ========== LangGraph Nodes ==========
-
-
-async def analyze_node(state: AgentState):
-    """에러 분석 노드 (비동기)"""
-    print("\n🤖 AI 에이전트 분석 중...")
-
-    messages = state["messages"]
-    error_info = state["error_info"]
-    git_ref = state.get("git_ref", "enhance/ai-log-analysis")
-
-    # 디버깅: 현재 messages 상태 확인
-    print(f"[DEBUG] Current messages count: {len(messages)}")
-    for i, msg in enumerate(messages):
-        msg_type = type(msg).__name__
-        has_tool_calls = hasattr(msg, 'tool_calls') and msg.tool_calls
-        print(f"  [{i}] {msg_type}, tool_calls={has_tool_calls}")
-
-    # 경로 정보만 출력 (로컬 파일 읽기 제거)
-    stack_trace = error_info['stack_trace']
-    print(f"📍 스택 트레이스 분석 중...")
-
-    # 🔑 AI 메시지 카운트로 판단 (최대 3번까지 도구 사용 허용)
-    ai_count = sum(1 for m in messages if isinstance(m, AIMessage))
-    should_use_tools = ai_count < 3  # 최대 3번까지 도구 사용
-
-    # 시스템 프롬프트
-    if should_use_tools:
-        # 첫 번째: 도구 사용 가능
-        system_msg = SystemMessage(content=f"""당신은 숙련된 PHP 백엔드 에러 분석 전문가입니다.
-
-**중요 정보:**
-- GitHub 저장소: {GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME}
-- Git 브랜치/커밋: {git_ref}
-- 반드시 GitHub MCP 도구를 사용하여 저장소에서 파일을 읽어야 합니다
-
-**핵심 규칙:**
-⚠️ 전체 파일을 일반적으로 분석하지 마세요!
-⚠️ 스택 트레이스의 **정확한 라인 번호**에 집중하세요!
-
-**당신의 임무 (깊이 있는 분석):**
-1. **에러 파일 읽기**
-   - 스택 트레이스에서 파일 경로 추출
-   - 예: `/home/fanding/application/controllers/rest/Post.php:851` → `application/controllers/rest/Post.php`
-   - get_file_contents로 읽기 (owner={GITHUB_REPO_OWNER}, repo={GITHUB_REPO_NAME}, path=파일경로, ref={git_ref})
-
-2. **에러 라인 정확히 분석**
-   - 851번째 줄의 실제 코드 확인
-   - 어떤 함수/클래스를 호출하는가?
-   - 어떤 변수를 인자로 전달하는가?
-   - 그 변수는 어디서 왔는가? (같은 함수 내에서 추적)
-
-3. **관련 파일들 추가로 읽기 (중요!)**
-   - 에러 라인에서 호출하는 클래스 파일 읽기
-     예: `new Post_view_data($x)` → `repo/model_post/Post_view_data.php` 파일 읽기
-   - 그 클래스의 __construct() 함수 확인 → 왜 int를 요구하는지?
-   - 문제 변수가 다른 함수에서 왔다면, 그 함수도 추적
-   - 필요하면 search_repository로 관련 파일 찾기
-
-4. **함수 호출 흐름 추적**
-   - 입력 파라미터 → 현재 함수 → 문제 변수 → 에러 발생
-   - 각 단계에서 왜 타입이 변했는지 추적
-
-5. **근본 원인 파악**
-   - 비즈니스 로직상 왜 이런 상황이 발생했는가?
-   - 앞단에서 validation이 빠졌는가?
-   - 데이터베이스에서 잘못된 타입으로 가져왔는가?
-
-**중요: 여러 파일을 읽으면서 깊이 파고드세요!**
-- 한 파일만 읽고 끝내지 마세요
-- 최소 2-3개 파일을 읽어야 근본 원인을 찾을 수 있습니다
-- get_file_contents, search_repository 도구를 적극 활용하세요
-
-**출력 형식 (구체적으로!):**
-
-## 🎯 원인 분석
-
-**에러 위치:**
-- 파일: Post.php:851
-- 메서드: [메서드명]
-- 코드: `[실제 코드 한 줄]`
-
-**왜 에러가 났는가:**
-1. **851라인에서 무엇을 했는지** - 구체적인 변수명과 값 포함
-   예: `$badData['post_no']` 값이 `'POST_10738'`인 상태로 생성자 호출
-2. **그 변수/값이 어디서 왔는지** - 메서드명과 반환값 명시
-   예: `$this->model_post->getPostViewDataWithBadTypes()`에서 반환
-   → DB 쿼리: `SELECT CONCAT('POST_', no) AS post_no ...`
-3. **왜 타입이 안 맞는지** - 실제 값과 예상 타입 비교
-   예: `$badData['post_no']` = `'POST_10738'` (string)
-   → `Post_view_data::__construct(int $post_no)` 는 int 요구
-4. **근본 원인** - CONCAT 사용으로 문자열 반환
-
-**해결:**
-`(int)$badData['post_no']` 또는 쿼리를 `SELECT no AS post_no`로 수정
-
-**스택 트레이스의 실제 값을 반드시 언급하세요!**
-""")
-
-        # 첫 번째 호출인지 확인
-        if ai_count == 0:
-            # 첫 번째: 에러 파일 읽기 시작
-            # 스택 트레이스에서 라인 번호 추출
-            import re
-            line_match = re.search(r'Post\.php.*?line (\d+)', error_info['error_message'])
-            error_line = line_match.group(1) if line_match else "unknown"
-
-            # 스택 트레이스 인사이트 추출
-            stack_insights = _extract_stack_trace_insights(error_info['stack_trace'])
-
-            # 실제 인자 값 강조
-            actual_args_info = ""
-            if stack_insights["actual_arguments"]:
-                actual_args_info = f"""
-🔥 **스택 트레이스에서 발견한 실제 인자 값:**
-{chr(10).join(f"   - {arg}" for arg in stack_insights["actual_arguments"])}
-
-⚠️ **이 값들이 핵심입니다!** 왜 이런 값이 전달되었는지 추적하세요!
-"""
-
-            # 타입 에러 정보
-            type_error_info = ""
-            if stack_insights["type_errors"]:
-                te = stack_insights["type_errors"][0]
-                type_error_info = f"**타입 불일치:** 예상={te['expected']}, 실제={te['actual']}\n"
-
-            content = f"""🚨 **에러 분석 시작** 🚨
-
-**에러 정보:**
-타입: {error_info['error_type']}
-메시지: {error_info['error_message']}
-{type_error_info}
-**에러 라인:** {error_line}
-{actual_args_info}
-**첫 번째 작업: 에러가 발생한 파일을 읽으세요**
-- get_file_contents 도구로 Post.php 파일 읽기
-- owner: {GITHUB_REPO_OWNER}, repo: {GITHUB_REPO_NAME}, ref: {git_ref}
-- path: application/controllers/rest/Post.php
-- {error_line}번째 줄에서 **왜 위 값들이 전달되었는지** 확인
-"""
-        else:
-            # 두 번째 이후: 더 깊이 파고들기 - 스택 트레이스 재강조
-            stack_insights = _extract_stack_trace_insights(error_info['stack_trace'])
-
-            actual_args_reminder = ""
-            if stack_insights["actual_arguments"]:
-                actual_args_reminder = f"""
-🔥 **다시 한번! 스택 트레이스의 실제 값:**
-{chr(10).join(f"   - {arg}" for arg in stack_insights["actual_arguments"])}
-→ 이 값들이 **왜, 어디서** 나왔는지 찾으세요!
-"""
-
-            content = f"""이전에 읽은 파일을 바탕으로 더 깊이 분석하세요.
-{actual_args_reminder}
-**다음 작업 (구체적으로!):**
-1. **호출된 메서드의 반환값 추적**
-   - 에러 라인의 코드를 확인했으니, 어떤 변수에 어떤 값이 들어갔는지 파악
-   - 예: `$badData = $this->model_post->getPostViewDataWithBadTypes()`
-   - `$badData['post_no']`의 실제 값은? (스택 트레이스 참조)
-
-2. **DB 쿼리 확인 (중요!)**
-   - 그 메서드 안의 SQL 쿼리 찾기
-   - CONCAT, CAST 등 타입 변환 함수 사용 여부
-   - 예: `SELECT CONCAT('POST_', no) AS post_no` → 문자열 반환!
-
-3. **변수 → 생성자 전달 과정**
-   - 어떤 변수가 생성자에 전달되었는지
-   - 예: `new Post_view_data($badData['post_no'])` → 'POST_10738' 전달
-
-**이제 충분한 정보가 있으면 도구 호출 없이 바로 최종 분석 작성!**
-"""
-
-        error_msg = HumanMessage(content=content)
-
-        # GitHub MCP 도구만 사용 - 매번 새로운 세션에서 도구 로드
-        if not github_mcp_server_params:
-            raise Exception("GitHub MCP가 초기화되지 않았습니다. GITHUB_TOKEN을 설정하고 서버를 재시작하세요.")
-
-        # 새로운 세션 생성 및 도구 로드
-        async with stdio_client(github_mcp_server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                tools = await load_mcp_tools(session)
-
-                llm_with_tools = llm.bind_tools(tools)
-                response = await llm_with_tools.ainvoke([system_msg, error_msg])
-
-    else:
-        # 3번 이후: 도구 사용 끝, 최종 분석 (도구 없이)
-        print(f"🏁 최종 분석 단계 (AI 호출 {ai_count + 1}회차)")
-
-        # 스택 트레이스 다시 상기
-        stack_insights = _extract_stack_trace_insights(error_info['stack_trace'])
-        actual_values_reminder = ""
-        if stack_insights["actual_arguments"]:
-            actual_values_reminder = f"\n🔥 **스택 트레이스의 실제 값 (반드시 언급!):**\n{chr(10).join(f'   - {arg}' for arg in stack_insights['actual_arguments'])}\n"
-
-        prompt_msg = HumanMessage(content=f"""지금까지 읽은 파일을 바탕으로 **구체적으로** 분석하세요.
-{actual_values_reminder}
-**형식:**
-## 🎯 원인 분석
-**에러 위치:** 파일:라인, 메서드, 코드
-
-**왜 에러가 났는가:** (4단계로)
-1. **어떤 변수에 어떤 값이 들어갔는지** - 스택 트레이스의 실제 값 명시
-   예: `$badData['post_no']` 값이 `'POST_10738'`
-2. **그 값이 어디서 왔는지** - 메서드명과 DB 쿼리 명시
-   예: `getPostViewDataWithBadTypes()` → `CONCAT('POST_', no)`
-3. **왜 타입이 안 맞는지** - 실제 타입 vs 예상 타입
-   예: 'POST_10738' (string) vs int 요구
-4. **근본 원인** - 왜 이런 상황이 발생했는지
-
-**해결:** 구체적인 코드 수정
-
-**중요: 스택 트레이스의 실제 값들을 반드시 포함하세요!**
-""")
-
-        # messages 순서 유지: [AI(tool_calls), ToolMessage, ...]
-        response = await llm.ainvoke(messages + [prompt_msg])
-
-    # 토큰 사용량 추적
-    current_token_usage = state.get("token_usage", {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0})
-
-    # 디버깅: response 구조 확인
-    print(f"[DEBUG] Response type: {type(response)}")
-    print(f"[DEBUG] Has usage_metadata: {hasattr(response, 'usage_metadata')}")
-    print(f"[DEBUG] Has response_metadata: {hasattr(response, 'response_metadata')}")
-    if hasattr(response, 'response_metadata'):
-        print(f"[DEBUG] response_metadata keys: {response.response_metadata.keys() if response.response_metadata else 'None'}")
-
-    # LangChain AIMessage의 usage_metadata 확인
-    if hasattr(response, 'usage_metadata') and response.usage_metadata:
-        current_token_usage["input_tokens"] += response.usage_metadata.get("input_tokens", 0)
-        current_token_usage["output_tokens"] += response.usage_metadata.get("output_tokens", 0)
-        current_token_usage["total_tokens"] += response.usage_metadata.get("total_tokens", 0)
-        print(f"  [AI 호출 {ai_count + 1}] 입력: {response.usage_metadata.get('input_tokens', 0)}, 출력: {response.usage_metadata.get('output_tokens', 0)}")
-    elif hasattr(response, 'response_metadata') and 'token_usage' in response.response_metadata:
-        # 다른 형태의 메타데이터
-        token_info = response.response_metadata['token_usage']
-        current_token_usage["input_tokens"] += token_info.get("prompt_tokens", 0)
-        current_token_usage["output_tokens"] += token_info.get("completion_tokens", 0)
-        current_token_usage["total_tokens"] += token_info.get("total_tokens", 0)
-        print(f"  [AI 호출 {ai_count + 1}] 입력: {token_info.get('prompt_tokens', 0)}, 출력: {token_info.get('completion_tokens', 0)}")
-
-    return {
-        "messages": messages + [response],
-        "token_usage": current_token_usage
-    }
-
-
-async def tool_node_wrapper(state: AgentState):
-    """툴 실행 노드 (비동기) - 매번 새로운 GitHub MCP 세션 생성"""
-    print(f"🔧 GitHub MCP 툴 실행 중...")
-
-    messages = state["messages"]
-
-    # 디버깅: 도구 실행 전 messages 확인
-    print(f"[DEBUG] Before tool execution, messages count: {len(messages)}")
-    for i, msg in enumerate(messages):
-        msg_type = type(msg).__name__
-        has_tool_calls = hasattr(msg, 'tool_calls') and msg.tool_calls
-        if has_tool_calls:
-            tool_names = [tc.get('name') for tc in msg.tool_calls]
-            tool_args = [tc.get('args') for tc in msg.tool_calls]
-            print(f"  [{i}] {msg_type}, tool_calls={tool_names}")
-            for j, (name, args) in enumerate(zip(tool_names, tool_args)):
-                print(f"      Tool {j}: {name}({args})")
-        else:
-            print(f"  [{i}] {msg_type}, tool_calls=False")
-
-    # GitHub MCP 세션 확인
-    if not github_mcp_server_params:
-        raise Exception("GitHub MCP가 초기화되지 않았습니다.")
-
-    # 새로운 세션 생성 및 도구 실행
-    async with stdio_client(github_mcp_server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
-            tools = await load_mcp_tools(session)
-
-            tool_node = ToolNode(tools)
-            result = await tool_node.ainvoke(state)
-
-            # GitHub 파일 내용 처리 및 에러 라인 추출
-            import json
-
-            # state에서 에러 라인 번호 가져오기
-            error_line_num = state.get('error_line')
-            if error_line_num:
-                print(f"🎯 에러 라인 번호 사용: {error_line_num}")
-            else:
-                print("⚠️ 에러 라인 번호를 찾을 수 없음")
-
-            messages = result.get('messages', [])
-            for msg in messages:
-                if type(msg).__name__ == 'ToolMessage':
-                    try:
-                        # JSON 파싱
-                        parsed = json.loads(msg.content)
-
-                        # content 필드가 있는 경우 (GitHub MCP는 이미 디코딩된 문자열을 반환함)
-                        if 'content' in parsed:
-                            file_content = parsed['content']
-                            print(f"✅ GitHub 파일 내용 확인: {len(file_content)} chars")
-
-                            # 에러 라인 주변 코드 추출 (±30줄)
-                            if error_line_num:
-                                lines = file_content.split('\n')
-                                total_lines = len(lines)
-
-                                # 에러 라인 주변만 추출 (전체 파일 대신)
-                                context_range = 30
-                                start = max(0, error_line_num - context_range - 1)  # 배열은 0-based
-                                end = min(total_lines, error_line_num + context_range)
-
-                                error_lines = []
-                                for i in range(start, end):
-                                    line_marker = ">>> 🔥 " if (i + 1) == error_line_num else "     "
-                                    error_lines.append(f"{line_marker}{i+1:4d} | {lines[i]}")
-
-                                error_context = "\n".join(error_lines)
-                                print(f"✅ 에러 라인 컨텍스트 추출 완료: {error_line_num}번 라인 (±{context_range}줄)")
-
-                                # 새로운 형식으로 변환 - 에러 라인 주변 코드만 제공
-                                new_content = f"""📄 파일: {parsed.get('name', 'unknown')}
-경로: {parsed.get('path', 'unknown')}
-전체 크기: {parsed.get('size', 0)} bytes (총 {total_lines}줄)
-
-🎯🎯🎯 에러 발생 라인 {error_line_num} 주변 코드 (±{context_range}줄) 🎯🎯🎯
-{'='*80}
-{error_context}
-{'='*80}
-
-⚠️ **중요: {error_line_num}번 라인 (🔥 표시)의 코드를 정확히 분석하세요!**
-이 라인에서 Post_view_data::__construct()가 호출되고 있고,
-첫 번째 인자로 int가 아닌 string이 전달되어 에러가 발생했습니다.
-"""
-                            else:
-                                # 에러 라인을 못 찾은 경우에만 전체 파일 제공
-                                print("⚠️ 에러 라인 번호를 찾을 수 없어 전체 파일 제공")
-                                new_content = f"""📄 파일: {parsed.get('name', 'unknown')}
-경로: {parsed.get('path', 'unknown')}
-크기: {parsed.get('size', 0)} bytes
-
-=== 전체 파일 내용 ===
-{file_content}
-=== 파일 내용 끝 ===
-"""
-
-                            # 메시지 내용 교체
-                            msg.content = new_content
-                            print(f"✅ GitHub 파일 포맷 변환 완료")
-                    except Exception as e:
-                        import traceback
-                        print(f"⚠️ 파일 처리 실패: {e}")
-                        print(f"📍 상세 에러:\n{traceback.format_exc()}")
-
-            # 디버깅: messages 구조 확인
-            print(f"[DEBUG] After tool execution, result messages count: {len(messages)}")
-            for i, msg in enumerate(messages):
-                msg_type = type(msg).__name__
-                if msg_type == 'ToolMessage':
-                    content_preview = str(msg.content)[:300]
-                    print(f"  [{i}] {msg_type}, content_preview: {content_preview}...")
-                else:
-                    print(f"  [{i}] {msg_type}")
-
-            return result
-
-
-def should_continue(state: AgentState):
-    """계속할지 결정"""
-    messages = state["messages"]
-    last_message = messages[-1]
-
-    # AI 메시지 카운트 (최대 4번만 반복)
-    ai_count = sum(1 for m in messages if isinstance(m, AIMessage))
-    if ai_count >= 4:
-        print(f"✅ 분석 완료 ({ai_count}회 반복)")
-        return "end"
-
-    # 툴 호출이 있으면 계속
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        return "tools"
-    return "end"
-
-
-async def extract_result(state: AgentState):
-    """최종 결과 추출 (비동기)"""
-    messages = state["messages"]
-
-    # 마지막 AI 메시지 찾기
-    for msg in reversed(messages):
-        if isinstance(msg, AIMessage) and msg.content:
-            return {"analysis_result": msg.content}
-
-    return {"analysis_result": "분석 실패"}
-
-
-# ========== LangGraph 생성 ==========
-
-workflow = StateGraph(AgentState)
-
-# 노드 추가
-workflow.add_node("analyze", analyze_node)
-workflow.add_node("tools", tool_node_wrapper)
-workflow.add_node("extract", extract_result)
-
-# 엣지 설정
-workflow.set_entry_point("analyze")
-workflow.add_conditional_edges(
-    "analyze",
-    should_continue,
-    {
-        "tools": "tools",
-        "end": "extract"
-    }
-)
-workflow.add_edge("tools", "analyze")
-workflow.add_edge("extract", END)
-
-# 컴파일
-graph = workflow.compile()
-
-
-# ========== Helper Functions ==========
-
-def _extract_stack_trace_insights(stack_trace: str) -> dict:
-    """
-    스택 트레이스에서 중요한 정보를 추출합니다.
-    - 실제 함수 호출 시 전달된 인자 값
-    - 함수/메서드 이름
-    - 타입 정보
-    """
-    insights = {
-        "actual_arguments": [],
-        "function_calls": [],
-        "type_errors": []
-    }
-
-    # PHP 함수 호출에서 실제 인자 값 추출
-    # 예: __construct('POST_10738', '1746', 'yes', 'invalid_price')
-    arg_pattern = r'(\w+)\((.*?)\)'
-    for match in re.finditer(arg_pattern, stack_trace):
-        function_name = match.group(1)
-        args_str = match.group(2)
-
-        if args_str and args_str.strip():
-            insights["function_calls"].append({
-                "function": function_name,
-                "arguments": args_str
-            })
-
-            # __construct나 주요 함수면 강조
-            if function_name in ['__construct', 'new', 'call_user_func']:
-                insights["actual_arguments"].append(f"{function_name}({args_str})")
-
-    # 타입 에러 정보 추출
-    # 예: "must be of the type int, string given"
-    type_pattern = r'must be of the type (\w+), (\w+) given'
-    type_match = re.search(type_pattern, stack_trace)
-    if type_match:
-        insights["type_errors"].append({
-            "expected": type_match.group(1),
-            "actual": type_match.group(2)
-        })
-
-    return insights
-
-def _extract_file_locations(stack_trace: str, base_path: str) -> List[dict]:
-    """스택 트레이스에서 파일 위치 정보 추출"""
-    locations = []
-
-    # Python
-    python_pattern = r'File\s+"([^"]+)",\s+line\s+(\d+)(?:,\s+in\s+(\w+))?'
-    for match in re.findall(python_pattern, stack_trace):
-        file_path, line_num, function = match
-        if base_path in file_path or os.path.isabs(file_path):
-            locations.append({
-                'file': file_path,
-                'line': int(line_num),
-                'function': function or None,
-                'language': 'python'
-            })
-
-    # PHP
-    php_pattern = r'([/\w\-\.]+\.php)[\(:]+(\d+)\)?'
-    for match in re.findall(php_pattern, stack_trace):
-        file_path, line_num = match
-        if base_path in file_path or os.path.isabs(file_path):
-            locations.append({
-                'file': file_path,
-                'line': int(line_num),
-                'function': None,
-                'language': 'php'
-            })
-
-    return locations
-
-
-# ========== FastAPI Endpoints ==========
-
-@app.get("/health")
-def health_check():
-    """헬스 체크"""
-    return {
-        "status": "ok",
-        "service": "error-debugger",
-        "version": "4.0.0"
-    }
-
-
-@app.post("/analyze")
-async def analyze_error(request: ErrorRequest):
-    """LangGraph로 에러 분석"""
-    try:
-        print("\n" + "="*80)
-        print("🚀 에러 분석 시작")
-        print(f"타입: {request.error_type}")
-        print(f"메시지: {request.error_message}")
-        print("="*80)
-
-        # 파일 위치 추출
-        file_locations = _extract_file_locations(
-            request.stack_trace,
-            request.server_base_path
-        )
-
-        print(f"\n📍 파일 위치: {len(file_locations)}개")
-        for loc in file_locations:
-            print(f"  - {loc['file']}:{loc['line']}")
-
-        if not file_locations:
-            return {
-                "success": False,
-                "error": "스택 트레이스에서 파일 위치를 찾을 수 없음",
-                "analysis": None
-            }
-
-        # 에러 라인 번호 추출 (스택 트레이스에서 첫 번째 발생 위치)
-        import re
-        error_line = None
-        line_match = re.search(r'Post\.php.*?line (\d+)', request.error_message)
-        if line_match:
-            error_line = int(line_match.group(1))
-            print(f"🎯 에러 라인 추출: {error_line}")
-
-        # Git ref 정보 출력
-        print(f"📌 Git ref: {request.git_ref}")
-
-        # LangGraph 실행
-        initial_state = {
-            "messages": [],
-            "error_info": {
-                "error_type": request.error_type,
-                "error_message": request.error_message,
-                "stack_trace": request.stack_trace,
-                "input_params": request.input_params,
-                "server_base_path": request.server_base_path
-            },
-            "error_line": error_line,
-            "git_ref": request.git_ref,
-            "analysis_result": None,
-            "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
-        }
-
-        # 그래프 실행 (비동기) - 전체 상태 추적
-        final_state = None
-        accumulated_token_usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
-
-        async for state in graph.astream(initial_state, {"recursion_limit": 15}):
-            print(f"\n[DEBUG] State keys: {state.keys()}")
-
-            # 각 노드의 token_usage 누적
-            for node_name, node_state in state.items():
-                if isinstance(node_state, dict) and "token_usage" in node_state:
-                    accumulated_token_usage = node_state["token_usage"]
-                    print(f"[DEBUG] {node_name} 노드의 토큰: {accumulated_token_usage}")
-
-            final_state = state
-
-        print(f"\n[DEBUG] Final state: {final_state}")
-
-        # 토큰 사용량 출력
-        if accumulated_token_usage["total_tokens"] > 0:
-            print(f"\n{'='*60}")
-            print(f"📊 토큰 사용량")
-            print(f"{'='*60}")
-            print(f"  입력 토큰  : {accumulated_token_usage['input_tokens']:>10,}")
-            print(f"  출력 토큰  : {accumulated_token_usage['output_tokens']:>10,}")
-            print(f"  {'─'*56}")
-            print(f"  총 토큰    : {accumulated_token_usage['total_tokens']:>10,}")
-            print(f"{'='*60}")
-        else:
-            print("\n⚠️ 토큰 사용량 정보를 찾을 수 없습니다.")
-
-        # 결과 추출
-        if final_state and "extract" in final_state:
-            analysis = final_state["extract"]["analysis_result"]
-            print(f"[DEBUG] Got analysis from extract node: {analysis[:100]}...")
-        elif final_state:
-            # 마지막 상태에서 분석 결과 찾기
-            last_state = list(final_state.values())[0]
-            print(f"[DEBUG] Last state keys: {last_state.keys() if isinstance(last_state, dict) else 'not a dict'}")
-
-            # messages에서 직접 추출 시도
-            if "messages" in last_state:
-                messages = last_state["messages"]
-                print(f"[DEBUG] Messages count: {len(messages)}")
-                for msg in reversed(messages):
-                    if isinstance(msg, AIMessage) and msg.content:
-                        analysis = msg.content
-                        print(f"[DEBUG] Found AI message: {analysis[:100]}...")
-                        break
-                else:
-                    analysis = last_state.get("analysis_result", "분석 실패")
-            else:
-                analysis = last_state.get("analysis_result", "분석 실패")
-        else:
-            analysis = "분석 실패"
-
-        print(f"\n✅ 분석 완료!")
-        print(f"\n📝 결과:\n{analysis}")
-        print("\n" + "="*80)
-
-        return {
-            "success": True,
-            "file_locations": file_locations,
-            "analysis": analysis
-        }
-
-    except Exception as e:
-        print(f"\n❌ 에러: {str(e)}")
-        print("="*80)
-        raise HTTPException(
-            status_code=500,
-            detail=f"분석 실패: {str(e)}"
-        )
-
-
-@app.on_event("startup")
-async def startup_event():
-    """서버 시작 시 GitHub MCP 초기화"""
-    print("\n" + "="*80)
-    print("🚀 Error Debugger API (LangGraph) 시작")
-    print("="*80)
-    await initialize_github_mcp()
-    print("="*80 + "\n")
-
-
-if __name__ == "__main__":
-    import uvicorn
-    print("🚀 Error Debugger API (LangGraph)")
-    print("   - LangGraph State Machine")
-    print("   - GitHub MCP 통합")
-    print("   - Port: 9000")
-    print("\n💡 GitHub MCP 사용을 위해 .env 파일에 다음을 설정하세요:")
-    print("   GITHUB_TOKEN=your_github_personal_access_token")
-    print("   GITHUB_REPO_OWNER=fanding")
-    print("   GITHUB_REPO_NAME=legacy-php-api\n")
-    uvicorn.run(app, host="0.0.0.0", port=9000)
-"""
-Error Debugger API with LangGraph
-PHP 에러 → FastAPI → LangGraph Agent → 비즈니스 로직 분석
-"""
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Optional, List, Annotated, TypedDict
-import os
-import re
-from dotenv import load_dotenv
-import json
-
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from langchain_core.tools import tool
-
-# MCP 관련 import
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from langchain_mcp_adapters.tools import load_mcp_tools
-import asyncio
+# uvloop이 설치되어 있으면 기본 이벤트 루프로 사용 (gunicorn 워커 등 비-main 실행 포함)
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    uvloop = None
 
 # 환경 변수 로드
 load_dotenv()
 
+# 요청 처리 경로 로거 (핸들러는 startup_event에서 설정)
+log = logging.getLogger("mcp_debugger")
+
+# OpenAI 호출용 공유 HTTP 클라이언트 (HTTP/2 + keep-alive로 턴마다 TLS 재협상 방지)
+_oai_client = httpx.AsyncClient(
+    http2=True,
+    timeout=60,
+    limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60)
+)
+
 # LLM 초기화
-llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0.3)
+llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0.3, http_async_client=_oai_client)
+# 최종 분석 전용 경량 모델 - 도구 결과를 이미 읽은 뒤 정리만 하므로 작은 모델로 충분
+llm_fast = ChatOpenAI(
+    model=os.getenv("FINAL_LLM_MODEL", "gpt-4.1-nano"),
+    temperature=0.1,
+    http_async_client=_oai_client
+)
+# 최종 분석 호출 - /analyze/stream에서 이 태그의 토큰만 클라이언트로 전송
+final_llm = llm_fast.with_config(tags=["final_analysis"])
 
 # GitHub 저장소 정보
 GITHUB_REPO_OWNER = os.getenv("GITHUB_REPO_OWNER", "fanding")
 GITHUB_REPO_NAME = os.getenv("GITHUB_REPO_NAME", "legacy-php-api")
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+# 미리 설치된 GitHub MCP 서버 엔트리 (예: /opt/mcp/server-github/dist/index.js)
+# 설정 시 npx 패키지 해석 없이 node로 바로 실행
+GITHUB_MCP_SERVER_JS = os.getenv("GITHUB_MCP_SERVER_JS")
+
+# 에러 메시지에서 에러 라인 번호 추출
+_ERR_LINE_RE = re.compile(r'Post\.php.*?line (\d+)')
+# 스택 트레이스 파일 위치 - Python(그룹 1~3) / PHP(그룹 4~5)를 하나의 alternation으로 한 번에 스캔
+# PHP 쪽은 경로 문자열 중간에서 매칭을 다시 시도하지 않도록 lookbehind로 시작점 고정 (선형 시간)
+_LOC_RE = re.compile(
+    r'File\s+"([^"]+)",\s+line\s+(\d+)(?:,\s+in\s+(\w+))?'
+    r'|(?<![/\w\-.])([/\w\-.]+\.php)[(:]+(\d+)\)?'
+)
+# 추출할 최대 파일 위치 수 (앞쪽 프레임만 분석에 사용)
+_MAX_FILE_LOCATIONS = 20
+# 비정상적으로 큰 스택 트레이스는 앞부분만 파싱
+_MAX_TRACE_CHARS = 64 * 1024
+# 에러 원인 분석 대상이 아닌 프레임워크/엔트리 파일 프레임
+_EXCLUDE_RE = re.compile(r'/(?:system|vendor|core|bootstrap)/|/(?:CodeIgniter|index)\.php')
+# 프롬프트용 인사이트 추출에 사용할 최대 프레임(비어 있지 않은 라인) 수
+_MAX_TRACE_FRAMES = 40
+# 함수 호출과 실제 인자 (한 줄 안에서 첫 `)`까지 - `.*?` 대신 부정 문자 클래스로 백트래킹 제거)
+_ARG_RE = re.compile(r'(\w+)\(([^)\n]*)\)')
+# 타입 에러 (예: "must be of the type int, string given")
+_TYPE_RE = re.compile(r'must be of the type (\w+), (\w+) given')
 
 # FastAPI 앱
 app = FastAPI(
@@ -861,20 +125,37 @@ class ErrorRequest(BaseModel):
 
 # GitHub MCP 서버 파라미터를 전역으로 저장
 github_mcp_server_params = None
+# 도구 스키마를 한 번만 바인딩한 LLM (startup에서 설정)
+llm_with_tools = None
+
+# 에이전트가 실제로 사용하는 도구만 LLM에 바인딩 (도구 스키마 토큰 절감)
+GITHUB_TOOL_NAMES = {"get_file_contents", "search_code"}
+
+async def _load_github_tools():
+    """새 GitHub MCP 세션을 열어 도구 목록을 로드합니다."""
+    async with stdio_client(github_mcp_server_params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            tools = await load_mcp_tools(session)
+            return [t for t in tools if t.name in GITHUB_TOOL_NAMES]
 
 async def initialize_github_mcp():
     """GitHub MCP 서버 파라미터를 초기화합니다."""
-    global github_mcp_server_params
+    global github_mcp_server_params, llm_with_tools
 
     if not GITHUB_TOKEN:
         print("⚠️  GITHUB_TOKEN이 설정되지 않아 GitHub MCP를 사용할 수 없습니다.")
         return False
 
     try:
-        # GitHub MCP 서버 설정 (npx 사용)
+        # GitHub MCP 서버 설정 (사전 설치본이 있으면 node 직접 실행, 없으면 npx)
+        if GITHUB_MCP_SERVER_JS:
+            command, args = "node", [GITHUB_MCP_SERVER_JS]
+        else:
+            command, args = "npx", ["-y", "@modelcontextprotocol/server-github"]
         github_mcp_server_params = StdioServerParameters(
-            command="npx",
-            args=["-y", "@modelcontextprotocol/server-github"],
+            command=command,
+            args=args,
             env={
                 "GITHUB_PERSONAL_ACCESS_TOKEN": GITHUB_TOKEN
             }
@@ -882,17 +163,15 @@ async def initialize_github_mcp():
 
         print(f"🔌 GitHub MCP 서버 설정 완료 (repo: {GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME})")
 
-        # 테스트 연결로 도구 목록 확인
-        async with stdio_client(github_mcp_server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                tools = await load_mcp_tools(session)
-                print(f"✅ GitHub MCP 도구 {len(tools)}개 사용 가능")
-                print(f"\n📋 사용 가능한 도구 목록:")
-                for tool in tools[:26]:  # 처음 10개만 출력
-                    print(f"  - {tool.name}: {tool.description[:80] if hasattr(tool, 'description') and tool.description else 'No description'}...")
-               
-                print()
+        # 테스트 연결로 도구 목록 확인 후, 도구 스키마를 LLM에 한 번만 바인딩
+        tools = await _load_github_tools()
+        llm_with_tools = llm.bind_tools(tools)
+        print(f"✅ GitHub MCP 도구 {len(tools)}개 사용 가능")
+        print(f"\n📋 사용 가능한 도구 목록:")
+        for tool in tools[:26]:  # 처음 10개만 출력
+            print(f"  - {tool.name}: {tool.description[:80] if hasattr(tool, 'description') and tool.description else 'No description'}...")
+
+        print()
 
         return True
     except Exception as e:
@@ -908,49 +187,35 @@ async def initialize_github_mcp():
 
 from operator import add
 
+@dataclass(slots=True, frozen=True)
+class ErrorInfo:
+    """요청 단위로 고정되는 에러 정보"""
+    error_type: str
+    error_message: str
+    stack_trace: str
+    input_params: Optional[str]
+    server_base_path: str
+
 class AgentState(TypedDict):
     messages: Annotated[list, add]  # add operator로 메시지 누적
-    error_info: dict
+    error_info: ErrorInfo
     error_line: int  # 에러 발생 라인 번호
     git_ref: str  # Git 브랜치/태그/커밋
     analysis_result: Optional[str]
     token_usage: dict  # 토큰 사용량 추적
+    last_ai_idx: Optional[int]  # 내용이 있는 마지막 AI 메시지 인덱스
+    tool_cache: dict  # (도구 이름, 인자 JSON) → 포맷팅된 결과 (요청 단위)
+    ai_turn_count: Annotated[int, add]  # analyze 노드 실행(AI 응답) 횟수 - 턴마다 1씩 누적
 
 
-# ========== LangGraph Nodes ==========
-
-
-async def analyze_node(state: AgentState):
-    """에러 분석 노드 (비동기)"""
-    print("\n🤖 AI 에이전트 분석 중...")
-
-    messages = state["messages"]
-    error_info = state["error_info"]
-    git_ref = state.get("git_ref", "enhance/ai-log-analysis")
-
-    # 디버깅: 현재 messages 상태 확인
-    print(f"[DEBUG] Current messages count: {len(messages)}")
-    for i, msg in enumerate(messages):
-        msg_type = type(msg).__name__
-        has_tool_calls = hasattr(msg, 'tool_calls') and msg.tool_calls
-        print(f"  [{i}] {msg_type}, tool_calls={has_tool_calls}")
-
-    # 경로 정보만 출력 (로컬 파일 읽기 제거)
-    stack_trace = error_info['stack_trace']
-    print(f"📍 스택 트레이스 분석 중...")
-
-    # 🔑 AI 메시지 카운트로 판단 (최대 3번까지 도구 사용 허용)
-    ai_count = sum(1 for m in messages if isinstance(m, AIMessage))
-    should_use_tools = ai_count < 3  # 최대 3번까지 도구 사용
+# ========== 프롬프트 템플릿 ==========
+# 정적인 프롬프트 골격은 한 번만 만들고 요청마다 동적 값만 채웁니다.
+# (PHP 변수의 `$`는 `$$`로 이스케이프)
 
-    # 시스템 프롬프트
-    if should_use_tools:
-        # 첫 번째: 도구 사용 가능
-        system_msg = SystemMessage(content=f"""당신은 숙련된 PHP 백엔드 에러 분석 전문가입니다.
+_SYSTEM_PROMPT = """당신은 숙련된 PHP 백엔드 에러 분석 전문가입니다.
 
 **중요 정보:**
-- GitHub 저장소: {GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME}
-- Git 브랜치/커밋: {git_ref}
+- GitHub 저장소와 Git 브랜치/커밋은 사용자 메시지의 **저장소 정보**를 사용하세요
 - 반드시 GitHub MCP 도구를 사용하여 저장소에서 파일을 읽어야 합니다
 
 **핵심 규칙:**
@@ -961,7 +226,7 @@ async def analyze_node(state: AgentState):
 1. **에러 파일 읽기**
    - 스택 트레이스에서 파일 경로 추출
    - 예: `/home/fanding/application/controllers/rest/Post.php:851` → `application/controllers/rest/Post.php`
-   - get_file_contents로 읽기 (owner={GITHUB_REPO_OWNER}, repo={GITHUB_REPO_NAME}, path=파일경로, ref={git_ref})
+   - get_file_contents로 읽기 (owner/repo/ref는 저장소 정보 그대로, path=파일경로)
 
 2. **에러 라인 정확히 분석**
    - 851번째 줄의 실제 코드 확인
@@ -974,7 +239,7 @@ async def analyze_node(state: AgentState):
      예: `new Post_view_data($x)` → `repo/model_post/Post_view_data.php` 파일 읽기
    - 그 클래스의 __construct() 함수 확인 → 왜 int를 요구하는지?
    - 문제 변수가 다른 함수에서 왔다면, 그 함수도 추적
-   - 필요하면 search_repository로 관련 파일 찾기
+   - 필요하면 search_code로 관련 파일 찾기
 
 4. **함수 호출 흐름 추적**
    - 입력 파라미터 → 현재 함수 → 문제 변수 → 에러 발생
@@ -988,7 +253,7 @@ async def analyze_node(state: AgentState):
 **중요: 여러 파일을 읽으면서 깊이 파고드세요!**
 - 한 파일만 읽고 끝내지 마세요
 - 최소 2-3개 파일을 읽어야 근본 원인을 찾을 수 있습니다
-- get_file_contents, search_repository 도구를 적극 활용하세요
+- get_file_contents, search_code 도구를 적극 활용하세요
 
 **출력 형식 (구체적으로!):**
 
@@ -1014,19 +279,112 @@ async def analyze_node(state: AgentState):
 `(int)$badData['post_no']` 또는 쿼리를 `SELECT no AS post_no`로 수정
 
 **스택 트레이스의 실제 값을 반드시 언급하세요!**
+"""
+
+# 요청마다 바뀌는 값이 없는 고정 시스템 메시지 - 모든 요청/턴에서 같은 prefix로 OpenAI 프롬프트 캐시 적중
+_SYSTEM_MSG = SystemMessage(content=_SYSTEM_PROMPT)
+
+
+_FIRST_TURN_TPL = string.Template("""🚨 **에러 분석 시작** 🚨
+
+**저장소 정보:** owner=${owner}, repo=${repo}, ref=${git_ref}
+
+**에러 정보:**
+타입: ${error_type}
+메시지: ${error_message}
+${type_error_info}
+**에러 라인:** ${error_line}
+${actual_args_info}
+**첫 번째 작업: 에러가 발생한 파일을 읽으세요**
+- get_file_contents 도구로 Post.php 파일 읽기
+- owner: ${owner}, repo: ${repo}, ref: ${git_ref}
+- path: application/controllers/rest/Post.php
+- ${error_line}번째 줄에서 **왜 위 값들이 전달되었는지** 확인
+""")
+
+_FOLLOWUP_TURN_TPL = string.Template("""**저장소 정보:** owner=${owner}, repo=${repo}, ref=${git_ref}
+
+이전에 읽은 파일을 바탕으로 더 깊이 분석하세요.
+${actual_args_reminder}
+**다음 작업 (구체적으로!):**
+1. **호출된 메서드의 반환값 추적**
+   - 에러 라인의 코드를 확인했으니, 어떤 변수에 어떤 값이 들어갔는지 파악
+   - 예: `$$badData = $$this->model_post->getPostViewDataWithBadTypes()`
+   - `$$badData['post_no']`의 실제 값은? (스택 트레이스 참조)
+
+2. **DB 쿼리 확인 (중요!)**
+   - 그 메서드 안의 SQL 쿼리 찾기
+   - CONCAT, CAST 등 타입 변환 함수 사용 여부
+   - 예: `SELECT CONCAT('POST_', no) AS post_no` → 문자열 반환!
+
+3. **변수 → 생성자 전달 과정**
+   - 어떤 변수가 생성자에 전달되었는지
+   - 예: `new Post_view_data($$badData['post_no'])` → 'POST_10738' 전달
+
+**이제 충분한 정보가 있으면 도구 호출 없이 바로 최종 분석 작성!**
+""")
+
+_FINAL_TURN_TPL = string.Template("""지금까지 읽은 파일을 바탕으로 **구체적으로** 분석하세요.
+${actual_values_reminder}
+**형식:**
+## 🎯 원인 분석
+**에러 위치:** 파일:라인, 메서드, 코드
+
+**왜 에러가 났는가:** (4단계로)
+1. **어떤 변수에 어떤 값이 들어갔는지** - 스택 트레이스의 실제 값 명시
+   예: `$$badData['post_no']` 값이 `'POST_10738'`
+2. **그 값이 어디서 왔는지** - 메서드명과 DB 쿼리 명시
+   예: `getPostViewDataWithBadTypes()` → `CONCAT('POST_', no)`
+3. **왜 타입이 안 맞는지** - 실제 타입 vs 예상 타입
+   예: 'POST_10738' (string) vs int 요구
+4. **근본 원인** - 왜 이런 상황이 발생했는지
+
+**해결:** 구체적인 코드 수정
+
+**중요: 스택 트레이스의 실제 값들을 반드시 포함하세요!**
 """)
 
+
+# ========== LangGraph Nodes ==========
+
+
+async def analyze_node(state: AgentState):
+    """에러 분석 노드 (비동기)"""
+    log.debug("🤖 AI 에이전트 분석 중...")
+
+    messages = state["messages"]
+    error_info = state["error_info"]
+    git_ref = state.get("git_ref", "enhance/ai-log-analysis")
+
+    # 디버깅: 현재 messages 상태 확인
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("[DEBUG] Current messages count: %d", len(messages))
+        for i, msg in enumerate(messages):
+            has_tool_calls = hasattr(msg, 'tool_calls') and bool(msg.tool_calls)
+            log.debug("  [%d] %s, tool_calls=%s", i, type(msg).__name__, has_tool_calls)
+
+    # 🔑 AI 응답 횟수로 판단 (최대 3번까지 도구 사용 허용)
+    ai_count = state.get("ai_turn_count", 0)
+    should_use_tools = ai_count < 3  # 최대 3번까지 도구 사용
+
+    # 시스템 프롬프트
+    if should_use_tools:
+        # GitHub MCP 도구만 사용 - startup에서 바인딩한 LLM 재사용 (턴마다 세션/스키마 생성 없음)
+        if llm_with_tools is None:
+            raise Exception("GitHub MCP가 초기화되지 않았습니다. GITHUB_TOKEN을 설정하고 서버를 재시작하세요.")
+
+        stack_insights = await asyncio.to_thread(_extract_stack_trace_insights, error_info.stack_trace)
+
+        # 첫 번째: 도구 사용 가능
+        system_msg = _SYSTEM_MSG
+
         # 첫 번째 호출인지 확인
         if ai_count == 0:
             # 첫 번째: 에러 파일 읽기 시작
             # 스택 트레이스에서 라인 번호 추출
-            import re
-            line_match = re.search(r'Post\.php.*?line (\d+)', error_info['error_message'])
+            line_match = _ERR_LINE_RE.search(error_info.error_message)
             error_line = line_match.group(1) if line_match else "unknown"
 
-            # 스택 트레이스 인사이트 추출
-            stack_insights = _extract_stack_trace_insights(error_info['stack_trace'])
-
             # 실제 인자 값 강조
             actual_args_info = ""
             if stack_insights["actual_arguments"]:
@@ -1043,24 +401,18 @@ async def analyze_node(state: AgentState):
                 te = stack_insights["type_errors"][0]
                 type_error_info = f"**타입 불일치:** 예상={te['expected']}, 실제={te['actual']}\n"
 
-            content = f"""🚨 **에러 분석 시작** 🚨
-
-**에러 정보:**
-타입: {error_info['error_type']}
-메시지: {error_info['error_message']}
-{type_error_info}
-**에러 라인:** {error_line}
-{actual_args_info}
-**첫 번째 작업: 에러가 발생한 파일을 읽으세요**
-- get_file_contents 도구로 Post.php 파일 읽기
-- owner: {GITHUB_REPO_OWNER}, repo: {GITHUB_REPO_NAME}, ref: {git_ref}
-- path: application/controllers/rest/Post.php
-- {error_line}번째 줄에서 **왜 위 값들이 전달되었는지** 확인
-"""
+            content = _FIRST_TURN_TPL.substitute(
+                error_type=error_info.error_type,
+                error_message=error_info.error_message,
+                type_error_info=type_error_info,
+                error_line=error_line,
+                actual_args_info=actual_args_info,
+                owner=GITHUB_REPO_OWNER,
+                repo=GITHUB_REPO_NAME,
+                git_ref=git_ref
+            )
         else:
             # 두 번째 이후: 더 깊이 파고들기 - 스택 트레이스 재강조
-            stack_insights = _extract_stack_trace_insights(error_info['stack_trace'])
-
             actual_args_reminder = ""
             if stack_insights["actual_arguments"]:
                 actual_args_reminder = f"""
@@ -1069,146 +421,94 @@ async def analyze_node(state: AgentState):
 → 이 값들이 **왜, 어디서** 나왔는지 찾으세요!
 """
 
-            content = f"""이전에 읽은 파일을 바탕으로 더 깊이 분석하세요.
-{actual_args_reminder}
-**다음 작업 (구체적으로!):**
-1. **호출된 메서드의 반환값 추적**
-   - 에러 라인의 코드를 확인했으니, 어떤 변수에 어떤 값이 들어갔는지 파악
-   - 예: `$badData = $this->model_post->getPostViewDataWithBadTypes()`
-   - `$badData['post_no']`의 실제 값은? (스택 트레이스 참조)
-
-2. **DB 쿼리 확인 (중요!)**
-   - 그 메서드 안의 SQL 쿼리 찾기
-   - CONCAT, CAST 등 타입 변환 함수 사용 여부
-   - 예: `SELECT CONCAT('POST_', no) AS post_no` → 문자열 반환!
-
-3. **변수 → 생성자 전달 과정**
-   - 어떤 변수가 생성자에 전달되었는지
-   - 예: `new Post_view_data($badData['post_no'])` → 'POST_10738' 전달
-
-**이제 충분한 정보가 있으면 도구 호출 없이 바로 최종 분석 작성!**
-"""
+            content = _FOLLOWUP_TURN_TPL.substitute(
+                actual_args_reminder=actual_args_reminder,
+                owner=GITHUB_REPO_OWNER,
+                repo=GITHUB_REPO_NAME,
+                git_ref=git_ref
+            )
 
         error_msg = HumanMessage(content=content)
 
-        # GitHub MCP 도구만 사용 - 매번 새로운 세션에서 도구 로드
-        if not github_mcp_server_params:
-            raise Exception("GitHub MCP가 초기화되지 않았습니다. GITHUB_TOKEN을 설정하고 서버를 재시작하세요.")
-
-        # 새로운 세션 생성 및 도구 로드
-        async with stdio_client(github_mcp_server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                tools = await load_mcp_tools(session)
-
-                llm_with_tools = llm.bind_tools(tools)
-                response = await llm_with_tools.ainvoke([system_msg, error_msg])
+        # 도구 스키마만 바인딩하므로 세션이 닫힌 뒤에도 호출 가능
+        response = await llm_with_tools.ainvoke([system_msg, error_msg])
 
     else:
         # 3번 이후: 도구 사용 끝, 최종 분석 (도구 없이)
-        print(f"🏁 최종 분석 단계 (AI 호출 {ai_count + 1}회차)")
+        log.debug("🏁 최종 분석 단계 (AI 호출 %d회차)", ai_count + 1)
 
+        # (이전 AI 응답이 이미 완성된 최종 분석이면 should_continue가 여기 오기 전에 종료)
         # 스택 트레이스 다시 상기
-        stack_insights = _extract_stack_trace_insights(error_info['stack_trace'])
+        stack_insights = await asyncio.to_thread(_extract_stack_trace_insights, error_info.stack_trace)
         actual_values_reminder = ""
         if stack_insights["actual_arguments"]:
             actual_values_reminder = f"\n🔥 **스택 트레이스의 실제 값 (반드시 언급!):**\n{chr(10).join(f'   - {arg}' for arg in stack_insights['actual_arguments'])}\n"
 
-        prompt_msg = HumanMessage(content=f"""지금까지 읽은 파일을 바탕으로 **구체적으로** 분석하세요.
-{actual_values_reminder}
-**형식:**
-## 🎯 원인 분석
-**에러 위치:** 파일:라인, 메서드, 코드
-
-**왜 에러가 났는가:** (4단계로)
-1. **어떤 변수에 어떤 값이 들어갔는지** - 스택 트레이스의 실제 값 명시
-   예: `$badData['post_no']` 값이 `'POST_10738'`
-2. **그 값이 어디서 왔는지** - 메서드명과 DB 쿼리 명시
-   예: `getPostViewDataWithBadTypes()` → `CONCAT('POST_', no)`
-3. **왜 타입이 안 맞는지** - 실제 타입 vs 예상 타입
-   예: 'POST_10738' (string) vs int 요구
-4. **근본 원인** - 왜 이런 상황이 발생했는지
-
-**해결:** 구체적인 코드 수정
-
-**중요: 스택 트레이스의 실제 값들을 반드시 포함하세요!**
-""")
+        prompt_msg = HumanMessage(content=_FINAL_TURN_TPL.substitute(
+            actual_values_reminder=actual_values_reminder
+        ))
 
         # messages 순서 유지: [AI(tool_calls), ToolMessage, ...]
-        response = await llm.ainvoke(messages + [prompt_msg])
+        response = await final_llm.ainvoke(messages + [prompt_msg])
 
     # 토큰 사용량 추적
     current_token_usage = state.get("token_usage", {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0})
 
     # 디버깅: response 구조 확인
-    print(f"[DEBUG] Response type: {type(response)}")
-    print(f"[DEBUG] Has usage_metadata: {hasattr(response, 'usage_metadata')}")
-    print(f"[DEBUG] Has response_metadata: {hasattr(response, 'response_metadata')}")
-    if hasattr(response, 'response_metadata'):
-        print(f"[DEBUG] response_metadata keys: {response.response_metadata.keys() if response.response_metadata else 'None'}")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("[DEBUG] Response type: %s", type(response))
+        log.debug("[DEBUG] Has usage_metadata: %s", hasattr(response, 'usage_metadata'))
+        log.debug("[DEBUG] Has response_metadata: %s", hasattr(response, 'response_metadata'))
+        if hasattr(response, 'response_metadata'):
+            log.debug("[DEBUG] response_metadata keys: %s", response.response_metadata.keys() if response.response_metadata else 'None')
 
     # LangChain AIMessage의 usage_metadata 확인
     if hasattr(response, 'usage_metadata') and response.usage_metadata:
         current_token_usage["input_tokens"] += response.usage_metadata.get("input_tokens", 0)
         current_token_usage["output_tokens"] += response.usage_metadata.get("output_tokens", 0)
         current_token_usage["total_tokens"] += response.usage_metadata.get("total_tokens", 0)
-        print(f"  [AI 호출 {ai_count + 1}] 입력: {response.usage_metadata.get('input_tokens', 0)}, 출력: {response.usage_metadata.get('output_tokens', 0)}")
+        log.debug("  [AI 호출 %d] 입력: %s, 출력: %s", ai_count + 1, response.usage_metadata.get('input_tokens', 0), response.usage_metadata.get('output_tokens', 0))
     elif hasattr(response, 'response_metadata') and 'token_usage' in response.response_metadata:
         # 다른 형태의 메타데이터
         token_info = response.response_metadata['token_usage']
         current_token_usage["input_tokens"] += token_info.get("prompt_tokens", 0)
         current_token_usage["output_tokens"] += token_info.get("completion_tokens", 0)
         current_token_usage["total_tokens"] += token_info.get("total_tokens", 0)
-        print(f"  [AI 호출 {ai_count + 1}] 입력: {token_info.get('prompt_tokens', 0)}, 출력: {token_info.get('completion_tokens', 0)}")
+        log.debug("  [AI 호출 %d] 입력: %s, 출력: %s", ai_count + 1, token_info.get('prompt_tokens', 0), token_info.get('completion_tokens', 0))
 
-    return {
-        "messages": messages + [response],
-        "token_usage": current_token_usage
+    # add 리듀서가 누적하므로 새 응답만 반환
+    result = {
+        "messages": [response],
+        "token_usage": current_token_usage,
+        "ai_turn_count": 1
     }
+    if response.content:
+        # 리듀서가 붙인 뒤 response의 위치
+        result["last_ai_idx"] = len(messages)
+    return result
 
 
-async def tool_node_wrapper(state: AgentState):
-    """툴 실행 노드 (비동기) - 매번 새로운 GitHub MCP 세션 생성"""
-    print(f"🔧 GitHub MCP 툴 실행 중...")
-
-    messages = state["messages"]
-
-    # 디버깅: 도구 실행 전 messages 확인
-    print(f"[DEBUG] Before tool execution, messages count: {len(messages)}")
-    for i, msg in enumerate(messages):
-        msg_type = type(msg).__name__
-        has_tool_calls = hasattr(msg, 'tool_calls') and msg.tool_calls
-        if has_tool_calls:
-            tool_names = [tc.get('name') for tc in msg.tool_calls]
-            tool_args = [tc.get('args') for tc in msg.tool_calls]
-            print(f"  [{i}] {msg_type}, tool_calls={tool_names}")
-            for j, (name, args) in enumerate(zip(tool_names, tool_args)):
-                print(f"      Tool {j}: {name}({args})")
-        else:
-            print(f"  [{i}] {msg_type}, tool_calls=False")
-
-    # GitHub MCP 세션 확인
-    if not github_mcp_server_params:
-        raise Exception("GitHub MCP가 초기화되지 않았습니다.")
-
+async def _run_github_tools(state: AgentState, tool_calls: list):
+    """주어진 tool_calls만 새 GitHub MCP 세션에서 실행하고 결과 ToolMessage를 포맷팅"""
     # 새로운 세션 생성 및 도구 실행
     async with stdio_client(github_mcp_server_params) as (read, write):
         async with ClientSession(read, write) as session:
             await session.initialize()
             tools = await load_mcp_tools(session)
 
+            # 캐시에 없는 호출만 담은 AI 메시지로 ToolNode 실행
             tool_node = ToolNode(tools)
-            result = await tool_node.ainvoke(state)
+            result = await tool_node.ainvoke(
+                {"messages": [AIMessage(content="", tool_calls=tool_calls)]}
+            )
 
             # GitHub 파일 내용 처리 및 에러 라인 추출
-            import json
-
             # state에서 에러 라인 번호 가져오기
             error_line_num = state.get('error_line')
             if error_line_num:
-                print(f"🎯 에러 라인 번호 사용: {error_line_num}")
+                log.debug("🎯 에러 라인 번호 사용: %s", error_line_num)
             else:
-                print("⚠️ 에러 라인 번호를 찾을 수 없음")
+                log.debug("⚠️ 에러 라인 번호를 찾을 수 없음")
 
             messages = result.get('messages', [])
             for msg in messages:
@@ -1220,7 +520,7 @@ async def tool_node_wrapper(state: AgentState):
                         # content 필드가 있는 경우 (GitHub MCP는 이미 디코딩된 문자열을 반환함)
                         if 'content' in parsed:
                             file_content = parsed['content']
-                            print(f"✅ GitHub 파일 내용 확인: {len(file_content)} chars")
+                            log.debug("✅ GitHub 파일 내용 확인: %d chars", len(file_content))
 
                             # 에러 라인 주변 코드 추출 (±30줄)
                             if error_line_num:
@@ -1238,7 +538,7 @@ async def tool_node_wrapper(state: AgentState):
                                     error_lines.append(f"{line_marker}{i+1:4d} | {lines[i]}")
 
                                 error_context = "\n".join(error_lines)
-                                print(f"✅ 에러 라인 컨텍스트 추출 완료: {error_line_num}번 라인 (±{context_range}줄)")
+                                log.debug("✅ 에러 라인 컨텍스트 추출 완료: %s번 라인 (±%d줄)", error_line_num, context_range)
 
                                 # 새로운 형식으로 변환 - 에러 라인 주변 코드만 제공
                                 new_content = f"""📄 파일: {parsed.get('name', 'unknown')}
@@ -1256,7 +556,7 @@ async def tool_node_wrapper(state: AgentState):
 """
                             else:
                                 # 에러 라인을 못 찾은 경우에만 전체 파일 제공
-                                print("⚠️ 에러 라인 번호를 찾을 수 없어 전체 파일 제공")
+                                log.debug("⚠️ 에러 라인 번호를 찾을 수 없어 전체 파일 제공")
                                 new_content = f"""📄 파일: {parsed.get('name', 'unknown')}
 경로: {parsed.get('path', 'unknown')}
 크기: {parsed.get('size', 0)} bytes
@@ -1268,34 +568,96 @@ async def tool_node_wrapper(state: AgentState):
 
                             # 메시지 내용 교체
                             msg.content = new_content
-                            print(f"✅ GitHub 파일 포맷 변환 완료")
+                            log.debug("✅ GitHub 파일 포맷 변환 완료")
                     except Exception as e:
-                        import traceback
-                        print(f"⚠️ 파일 처리 실패: {e}")
-                        print(f"📍 상세 에러:\n{traceback.format_exc()}")
+                        log.warning("⚠️ 파일 처리 실패: %s", e, exc_info=True)
 
             # 디버깅: messages 구조 확인
-            print(f"[DEBUG] After tool execution, result messages count: {len(messages)}")
-            for i, msg in enumerate(messages):
-                msg_type = type(msg).__name__
-                if msg_type == 'ToolMessage':
-                    content_preview = str(msg.content)[:300]
-                    print(f"  [{i}] {msg_type}, content_preview: {content_preview}...")
-                else:
-                    print(f"  [{i}] {msg_type}")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("[DEBUG] After tool execution, result messages count: %d", len(messages))
+                for i, msg in enumerate(messages):
+                    msg_type = type(msg).__name__
+                    if msg_type == 'ToolMessage':
+                        content_preview = str(msg.content)[:300]
+                        log.debug("  [%d] %s, content_preview: %s...", i, msg_type, content_preview)
+                    else:
+                        log.debug("  [%d] %s", i, msg_type)
 
             return result
 
 
+async def tool_node_wrapper(state: AgentState):
+    """툴 실행 노드 (비동기) - 캐시에 없는 호출만 새로운 GitHub MCP 세션에서 실행"""
+    log.debug("🔧 GitHub MCP 툴 실행 중...")
+
+    messages = state["messages"]
+
+    # 디버깅: 도구 실행 전 messages 확인
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("[DEBUG] Before tool execution, messages count: %d", len(messages))
+        for i, msg in enumerate(messages):
+            msg_type = type(msg).__name__
+            has_tool_calls = hasattr(msg, 'tool_calls') and msg.tool_calls
+            if has_tool_calls:
+                tool_names = [tc.get('name') for tc in msg.tool_calls]
+                tool_args = [tc.get('args') for tc in msg.tool_calls]
+                log.debug("  [%d] %s, tool_calls=%s", i, msg_type, tool_names)
+                for j, (name, args) in enumerate(zip(tool_names, tool_args)):
+                    log.debug("      Tool %d: %s(%s)", j, name, args)
+            else:
+                log.debug("  [%d] %s, tool_calls=False", i, msg_type)
+
+    # GitHub MCP 세션 확인
+    if not github_mcp_server_params:
+        raise Exception("GitHub MCP가 초기화되지 않았습니다.")
+
+    # 같은 분석 안에서 동일한 도구 호출(같은 파일/ref)은 캐시된 결과 재사용
+    tool_calls = messages[-1].tool_calls
+    tool_cache = dict(state.get("tool_cache") or {})
+    call_keys = {
+        tc["id"]: (tc["name"], json.dumps(tc.get("args", {}), sort_keys=True))
+        for tc in tool_calls
+    }
+    miss_calls = [tc for tc in tool_calls if call_keys[tc["id"]] not in tool_cache]
+    log.debug("🗂️ 도구 캐시: hit %d / miss %d", len(tool_calls) - len(miss_calls), len(miss_calls))
+
+    fresh = {}
+    if miss_calls:
+        result = await _run_github_tools(state, miss_calls)
+        for msg in result.get('messages', []):
+            if isinstance(msg, ToolMessage):
+                fresh[msg.tool_call_id] = msg
+
+    # 원래 tool_calls 순서대로 결과 조립 (캐시 적중분은 ToolMessage 직접 생성)
+    tool_messages = []
+    for tc in tool_calls:
+        key = call_keys[tc["id"]]
+        msg = fresh.get(tc["id"])
+        if msg is not None:
+            # 실패한 호출은 캐시하지 않음 (다음 턴에 재시도 가능)
+            if getattr(msg, "status", None) != "error":
+                tool_cache[key] = msg.content
+        else:
+            msg = ToolMessage(content=tool_cache[key], name=tc["name"], tool_call_id=tc["id"])
+        tool_messages.append(msg)
+
+    return {"messages": tool_messages, "tool_cache": tool_cache}
+
+
 def should_continue(state: AgentState):
     """계속할지 결정"""
     messages = state["messages"]
     last_message = messages[-1]
 
-    # AI 메시지 카운트 (최대 4번만 반복)
-    ai_count = sum(1 for m in messages if isinstance(m, AIMessage))
+    # AI 응답 횟수 (최대 4번만 반복)
+    ai_count = state.get("ai_turn_count", 0)
     if ai_count >= 4:
-        print(f"✅ 분석 완료 ({ai_count}회 반복)")
+        log.debug("✅ 분석 완료 (%d회 반복)", ai_count)
+        return "end"
+
+    # 툴 호출이 붙어 있어도 이미 완성된 최종 분석이면 추가 라운드 없이 종료
+    if _find_final_analysis(messages):
+        log.debug("✅ 최종 분석 완료 - 남은 도구 호출 생략")
         return "end"
 
     # 툴 호출이 있으면 계속
@@ -1306,12 +668,9 @@ def should_continue(state: AgentState):
 
 async def extract_result(state: AgentState):
     """최종 결과 추출 (비동기)"""
-    messages = state["messages"]
-
-    # 마지막 AI 메시지 찾기
-    for msg in reversed(messages):
-        if isinstance(msg, AIMessage) and msg.content:
-            return {"analysis_result": msg.content}
+    last_ai_idx = state.get("last_ai_idx")
+    if last_ai_idx is not None:
+        return {"analysis_result": state["messages"][last_ai_idx].content}
 
     return {"analysis_result": "분석 실패"}
 
@@ -1357,10 +716,13 @@ def _extract_stack_trace_insights(stack_trace: str) -> dict:
         "type_errors": []
     }
 
+    # 앞쪽 프레임만 분석 (프롬프트에 들어가는 인자 목록이 트레이스 길이에 비례해 커지지 않도록)
+    frames = [line for line in stack_trace.splitlines() if line.strip()]
+    stack_trace = "\n".join(frames[:_MAX_TRACE_FRAMES])
+
     # PHP 함수 호출에서 실제 인자 값 추출
     # 예: __construct('POST_10738', '1746', 'yes', 'invalid_price')
-    arg_pattern = r'(\w+)\((.*?)\)'
-    for match in re.finditer(arg_pattern, stack_trace):
+    for match in _ARG_RE.finditer(stack_trace):
         function_name = match.group(1)
         args_str = match.group(2)
 
@@ -1376,8 +738,7 @@ def _extract_stack_trace_insights(stack_trace: str) -> dict:
 
     # 타입 에러 정보 추출
     # 예: "must be of the type int, string given"
-    type_pattern = r'must be of the type (\w+), (\w+) given'
-    type_match = re.search(type_pattern, stack_trace)
+    type_match = _TYPE_RE.search(stack_trace)
     if type_match:
         insights["type_errors"].append({
             "expected": type_match.group(1),
@@ -1386,35 +747,53 @@ def _extract_stack_trace_insights(stack_trace: str) -> dict:
 
     return insights
 
+# 완성된 최종 분석으로 판단하는 헤더
+_FINAL_ANALYSIS_MARKERS = ("## 🎯 원인 분석", "**해결:**")
+
+def _find_final_analysis(messages: list) -> Optional[str]:
+    """마지막 AI 응답이 이미 완성된 최종 분석이면 그 내용을 반환합니다."""
+    for msg in reversed(messages):
+        if isinstance(msg, AIMessage) and isinstance(msg.content, str) and msg.content:
+            if all(marker in msg.content for marker in _FINAL_ANALYSIS_MARKERS):
+                return msg.content
+            return None
+    return None
+
 def _extract_file_locations(stack_trace: str, base_path: str) -> List[dict]:
-    """스택 트레이스에서 파일 위치 정보 추출"""
+    """스택 트레이스에서 파일 위치 정보 추출 (Python/PHP 프레임을 한 번의 스캔으로, 트레이스 순서대로)"""
     locations = []
+    framework_locations = []  # 프레임워크/벤더 프레임 (앱 프레임이 없을 때만 사용)
+    seen = set()  # 같은 프레임이 여러 줄에 나와도 한 번만
 
-    # Python
-    python_pattern = r'File\s+"([^"]+)",\s+line\s+(\d+)(?:,\s+in\s+(\w+))?'
-    for match in re.findall(python_pattern, stack_trace):
-        file_path, line_num, function = match
-        if base_path in file_path or os.path.isabs(file_path):
-            locations.append({
+    for match in _LOC_RE.finditer(stack_trace[:_MAX_TRACE_CHARS]):
+        py_file, py_line, function, php_file, php_line = match.groups()
+        if py_file:
+            key = (py_file, int(py_line), 'python')
+        else:
+            key = (php_file, int(php_line), 'php')
+        if key in seen:
+            continue
+        seen.add(key)
+
+        file_path, line_num, language = key
+        # 저렴한 절대 경로 검사를 먼저 - 대부분의 프레임은 부분 문자열 검색 없이 통과
+        if not (os.path.isabs(file_path) or base_path in file_path):
+            continue
+
+        is_framework = language == 'php' and _EXCLUDE_RE.search(file_path)
+        target = framework_locations if is_framework else locations
+        if len(target) < _MAX_FILE_LOCATIONS:
+            target.append({
                 'file': file_path,
-                'line': int(line_num),
+                'line': line_num,
                 'function': function or None,
-                'language': 'python'
-            })
-
-    # PHP
-    php_pattern = r'([/\w\-\.]+\.php)[\(:]+(\d+)\)?'
-    for match in re.findall(php_pattern, stack_trace):
-        file_path, line_num = match
-        if base_path in file_path or os.path.isabs(file_path):
-            locations.append({
-                'file': file_path,
-                'line': int(line_num),
-                'function': None,
-                'language': 'php'
+                'language': language
             })
+        # 다운스트림은 앞쪽 프레임만 사용하므로 충분히 모이면 스캔 종료
+        if len(locations) >= _MAX_FILE_LOCATIONS:
+            break
 
-    return locations
+    return locations or framework_locations
 
 
 # ========== FastAPI Endpoints ==========
@@ -1429,26 +808,93 @@ def health_check():
     }
 
 
+async def _prepare_analysis(request: ErrorRequest):
+    """스택 트레이스 파싱 후 (file_locations, initial_state) 반환 - 위치가 없으면 state는 None"""
+    # 스택 트레이스 파싱은 워커 스레드에서 (이벤트 루프 블로킹 방지)
+    file_locations = await asyncio.to_thread(
+        _extract_file_locations,
+        request.stack_trace,
+        request.server_base_path
+    )
+    line_match = _ERR_LINE_RE.search(request.error_message)
+
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("📍 파일 위치: %d개", len(file_locations))
+        for loc in file_locations:
+            log.debug("  - %s:%s", loc['file'], loc['line'])
+
+    if not file_locations:
+        return file_locations, None
+
+    # 에러 라인 번호 (스택 트레이스에서 첫 번째 발생 위치)
+    error_line = None
+    if line_match:
+        error_line = int(line_match.group(1))
+        log.debug("🎯 에러 라인 추출: %d", error_line)
+
+    # Git ref 정보 출력
+    log.debug("📌 Git ref: %s", request.git_ref)
+
+    # LangGraph 실행
+    initial_state = {
+        "messages": [],
+        "error_info": ErrorInfo(
+            error_type=request.error_type,
+            error_message=request.error_message,
+            stack_trace=request.stack_trace,
+            input_params=request.input_params,
+            server_base_path=request.server_base_path
+        ),
+        "error_line": error_line,
+        "git_ref": request.git_ref,
+        "analysis_result": None,
+        "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+        "last_ai_idx": None,
+        "ai_turn_count": 0,
+        "tool_cache": {}
+    }
+    return file_locations, initial_state
+
+
+# 진행 중인 분석 (동일 에러 요청 → 하나의 분석 Task 공유)
+_inflight_analyses: dict = {}
+
+
+def _analysis_key(request: ErrorRequest) -> tuple:
+    """동일한 분석으로 간주할 요청 키"""
+    return (
+        request.error_type,
+        request.error_message,
+        request.stack_trace,
+        request.input_params,
+        request.server_base_path,
+        request.git_ref,
+    )
+
+
 @app.post("/analyze")
 async def analyze_error(request: ErrorRequest):
+    """LangGraph로 에러 분석 - 같은 에러가 동시에 들어오면 분석 한 번을 공유"""
+    key = _analysis_key(request)
+    task = _inflight_analyses.get(key)
+    if task is None:
+        task = asyncio.create_task(_run_analysis(request))
+        _inflight_analyses[key] = task
+        task.add_done_callback(lambda _: _inflight_analyses.pop(key, None))
+    else:
+        log.info("♻️ 동일한 에러 분석이 진행 중 - 결과 공유 (타입: %s)", request.error_type)
+
+    # 한 요청이 끊겨도 공유 중인 분석은 취소되지 않도록 shield
+    return await asyncio.shield(task)
+
+
+async def _run_analysis(request: ErrorRequest):
     """LangGraph로 에러 분석"""
     try:
-        print("\n" + "="*80)
-        print("🚀 에러 분석 시작")
-        print(f"타입: {request.error_type}")
-        print(f"메시지: {request.error_message}")
-        print("="*80)
-
-        # 파일 위치 추출
-        file_locations = _extract_file_locations(
-            request.stack_trace,
-            request.server_base_path
-        )
-
-        print(f"\n📍 파일 위치: {len(file_locations)}개")
-        for loc in file_locations:
-            print(f"  - {loc['file']}:{loc['line']}")
+        log.info("🚀 에러 분석 시작 - 타입: %s", request.error_type)
+        log.debug("메시지: %s", request.error_message)
 
+        file_locations, initial_state = await _prepare_analysis(request)
         if not file_locations:
             return {
                 "success": False,
@@ -1456,91 +902,59 @@ async def analyze_error(request: ErrorRequest):
                 "analysis": None
             }
 
-        # 에러 라인 번호 추출 (스택 트레이스에서 첫 번째 발생 위치)
-        import re
-        error_line = None
-        line_match = re.search(r'Post\.php.*?line (\d+)', request.error_message)
-        if line_match:
-            error_line = int(line_match.group(1))
-            print(f"🎯 에러 라인 추출: {error_line}")
-
-        # Git ref 정보 출력
-        print(f"📌 Git ref: {request.git_ref}")
-
-        # LangGraph 실행
-        initial_state = {
-            "messages": [],
-            "error_info": {
-                "error_type": request.error_type,
-                "error_message": request.error_message,
-                "stack_trace": request.stack_trace,
-                "input_params": request.input_params,
-                "server_base_path": request.server_base_path
-            },
-            "error_line": error_line,
-            "git_ref": request.git_ref,
-            "analysis_result": None,
-            "token_usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
-        }
-
         # 그래프 실행 (비동기) - 전체 상태 추적
         final_state = None
         accumulated_token_usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        # analyze 노드가 last_ai_idx를 갱신할 때의 AI 응답 (extract 없이 끝난 경우의 결과)
+        last_ai_analysis = None
 
         async for state in graph.astream(initial_state, {"recursion_limit": 15}):
-            print(f"\n[DEBUG] State keys: {state.keys()}")
+            log.debug("[DEBUG] State keys: %s", state.keys())
 
             # 각 노드의 token_usage 누적
             for node_name, node_state in state.items():
                 if isinstance(node_state, dict) and "token_usage" in node_state:
                     accumulated_token_usage = node_state["token_usage"]
-                    print(f"[DEBUG] {node_name} 노드의 토큰: {accumulated_token_usage}")
+                    log.debug("[DEBUG] %s 노드의 토큰: %s", node_name, accumulated_token_usage)
+                # 노드 업데이트의 messages는 이번에 추가된 것만 - last_ai_idx가 있으면 그 응답이 마지막
+                if isinstance(node_state, dict) and node_state.get("last_ai_idx") is not None:
+                    last_ai_analysis = node_state["messages"][-1].content
 
             final_state = state
 
-        print(f"\n[DEBUG] Final state: {final_state}")
+        log.debug("[DEBUG] Final state: %s", final_state)
 
         # 토큰 사용량 출력
         if accumulated_token_usage["total_tokens"] > 0:
-            print(f"\n{'='*60}")
-            print(f"📊 토큰 사용량")
-            print(f"{'='*60}")
-            print(f"  입력 토큰  : {accumulated_token_usage['input_tokens']:>10,}")
-            print(f"  출력 토큰  : {accumulated_token_usage['output_tokens']:>10,}")
-            print(f"  {'─'*56}")
-            print(f"  총 토큰    : {accumulated_token_usage['total_tokens']:>10,}")
-            print(f"{'='*60}")
+            log.info(
+                "📊 토큰 사용량 - 입력: %s, 출력: %s, 총: %s",
+                f"{accumulated_token_usage['input_tokens']:,}",
+                f"{accumulated_token_usage['output_tokens']:,}",
+                f"{accumulated_token_usage['total_tokens']:,}"
+            )
         else:
-            print("\n⚠️ 토큰 사용량 정보를 찾을 수 없습니다.")
+            log.info("⚠️ 토큰 사용량 정보를 찾을 수 없습니다.")
 
         # 결과 추출
         if final_state and "extract" in final_state:
             analysis = final_state["extract"]["analysis_result"]
-            print(f"[DEBUG] Got analysis from extract node: {analysis[:100]}...")
+            log.debug("[DEBUG] Got analysis from extract node: %.100s...", analysis)
         elif final_state:
             # 마지막 상태에서 분석 결과 찾기
             last_state = list(final_state.values())[0]
-            print(f"[DEBUG] Last state keys: {last_state.keys() if isinstance(last_state, dict) else 'not a dict'}")
-
-            # messages에서 직접 추출 시도
-            if "messages" in last_state:
-                messages = last_state["messages"]
-                print(f"[DEBUG] Messages count: {len(messages)}")
-                for msg in reversed(messages):
-                    if isinstance(msg, AIMessage) and msg.content:
-                        analysis = msg.content
-                        print(f"[DEBUG] Found AI message: {analysis[:100]}...")
-                        break
-                else:
-                    analysis = last_state.get("analysis_result", "분석 실패")
+            log.debug("[DEBUG] Last state keys: %s", last_state.keys() if isinstance(last_state, dict) else 'not a dict')
+
+            # messages를 역순으로 훑지 않고 스트리밍 중 기록한 last_ai_idx 응답 사용
+            if last_ai_analysis:
+                analysis = last_ai_analysis
+                log.debug("[DEBUG] Found AI message: %.100s...", analysis)
             else:
                 analysis = last_state.get("analysis_result", "분석 실패")
         else:
             analysis = "분석 실패"
 
-        print(f"\n✅ 분석 완료!")
-        print(f"\n📝 결과:\n{analysis}")
-        print("\n" + "="*80)
+        log.info("✅ 분석 완료!")
+        log.debug("📝 결과:\n%s", analysis)
 
         return {
             "success": True,
@@ -1549,17 +963,79 @@ async def analyze_error(request: ErrorRequest):
         }
 
     except Exception as e:
-        print(f"\n❌ 에러: {str(e)}")
-        print("="*80)
+        log.exception("❌ 에러: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"분석 실패: {str(e)}"
         )
 
 
+def _sse(payload: dict) -> str:
+    """SSE data 프레임 인코딩"""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@app.post("/analyze/stream")
+async def analyze_error_stream(request: ErrorRequest):
+    """LangGraph로 에러 분석 (SSE) - 최종 분석을 생성되는 대로 전송"""
+    log.info("🚀 에러 분석 시작 (stream) - 타입: %s", request.error_type)
+
+    file_locations, initial_state = await _prepare_analysis(request)
+    if not file_locations:
+        return {
+            "success": False,
+            "error": "스택 트레이스에서 파일 위치를 찾을 수 없음",
+            "analysis": None
+        }
+
+    async def event_stream():
+        yield _sse({"type": "start", "file_locations": file_locations})
+        streamed = False
+        analysis = "분석 실패"
+        try:
+            async for event in graph.astream_events(
+                initial_state, {"recursion_limit": 15}, version="v2"
+            ):
+                kind = event["event"]
+                if kind == "on_chat_model_stream" and "final_analysis" in event.get("tags", []):
+                    token = event["data"]["chunk"].content
+                    if token:
+                        streamed = True
+                        yield _sse({"type": "token", "content": token})
+                elif kind == "on_chain_end" and event.get("name") == "extract":
+                    output = event["data"].get("output") or {}
+                    analysis = output.get("analysis_result", analysis)
+        except Exception as e:
+            log.exception("❌ 에러: %s", e)
+            yield _sse({"type": "error", "detail": f"분석 실패: {str(e)}"})
+            return
+
+        # 이전 응답 재사용 등으로 스트리밍된 토큰이 없으면 결과를 한 번에 전송
+        if not streamed:
+            yield _sse({"type": "token", "content": analysis})
+        log.info("✅ 분석 완료! (stream)")
+        yield _sse({"type": "done", "analysis": analysis})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.on_event("startup")
 async def startup_event():
-    """서버 시작 시 GitHub MCP 초기화"""
+    """서버 시작 시 로깅 설정 및 GitHub MCP 초기화"""
+    # 요청 처리 경로 로그 레벨은 MCP_LOG_LEVEL로 조정 (기본 INFO, DEBUG 덤프는 기본 비활성)
+    if not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        log.addHandler(handler)
+        log.propagate = False
+        level = os.getenv("MCP_LOG_LEVEL", "INFO").upper()
+        if level in logging.getLevelNamesMapping():
+            log.setLevel(level)
+        else:
+            # 오타 등 알 수 없는 레벨로 서버가 시작하지 못하는 일이 없도록 INFO로 대체
+            log.setLevel(logging.INFO)
+            log.warning("⚠️ 알 수 없는 MCP_LOG_LEVEL=%r - INFO로 대체합니다", level)
+
     print("\n" + "="*80)
     print("🚀 Error Debugger API (LangGraph) 시작")
     print("="*80)
@@ -1567,6 +1043,12 @@ async def startup_event():
     print("="*80 + "\n")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """서버 종료 시 공유 HTTP 클라이언트 정리"""
+    await _oai_client.aclose()
+
+
 if __name__ == "__main__":
     import uvicorn
     print("🚀 Error Debugger API (LangGraph)")
@@ -1577,4 +1059,10 @@ if __name__ == "__main__":
     print("   GITHUB_TOKEN=your_github_personal_access_token")
     print("   GITHUB_REPO_OWNER=fanding")
     print("   GITHUB_REPO_NAME=legacy-php-api\n")
-    uvicorn.run(app, host="0.0.0.0", port=9000)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=9000,
+        loop="uvloop" if uvloop else "asyncio",
+        http="httptools"
+    )
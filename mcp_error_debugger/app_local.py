@@ -4,25 +4,65 @@ PHP 에러 → FastAPI → AI Agent (OpenAI + FastMCP tools) → 비즈니스 
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
+from types import SimpleNamespace
 import os
 import re
-from openai import OpenAI
+import asyncio
+import time
+import logging
+import logging.handlers
+import queue
+import glob
+import mmap
+import fnmatch
+import functools
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import anyio.to_thread
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
-import json
+import orjson
+import httpx
+
+# uvloop이 설치되어 있으면 기본 이벤트 루프로 사용
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    uvloop = None
 
 # 환경 변수 로드
 load_dotenv()
 
-# OpenAI 클라이언트 초기화
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI 클라이언트 초기화 (비동기 - LLM 응답 대기 중에도 이벤트 루프가 다른 요청 처리)
+# 툴 호출 루프의 반복 호출이 같은 연결을 재사용하도록 HTTP/2 + 커넥션 풀 공유
+openai_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    # 한도 초과(429)가 남더라도 SDK가 retry-after를 따르는 지수 백오프로 재시도
+    max_retries=6,
+    http_client=httpx.AsyncClient(
+        http2=True,
+        timeout=60,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=32, keepalive_expiry=60)
+    )
+)
+
+# 요청 처리 경로 로거 (핸들러는 startup_event에서 설정)
+log = logging.getLogger("mcp_debugger.local")
+# 로그 쓰기(stdout 시스템 콜)를 백그라운드 스레드로 넘기는 리스너
+_log_listener: Optional[logging.handlers.QueueListener] = None
 
 # FastAPI 앱
 app = FastAPI(
     title="Error Debugger API (Local Files)",
     description="AI 에이전트가 로컬 파일을 읽으며 비즈니스 로직까지 분석",
-    version="3.0.0-local"
+    version="3.0.0-local",
+    default_response_class=ORJSONResponse
 )
 
 # CORS 설정
@@ -51,6 +91,116 @@ class ErrorRequest(BaseModel):
 # ========== Tools for AI Agent ==========
 # OpenAI 에이전트가 사용할 툴들
 
+# 상대경로 해석에 사용할 기본 경로들 (마지막으로 현재 작업 디렉토리)
+_POSSIBLE_BASES = (
+    "/Users/fanding/develop/legacy-php-api",
+    "/Users/fanding/develop/ppp",
+)
+
+
+# 상대경로 해석 결과 (찾은 경우만 저장 - 이후 생긴 파일은 다시 탐색)
+# to_thread 워커들이 동시에 접근하므로 락으로 보호하고, 최근에 쓴 경로만 LRU로 유지
+_RESOLVED_PATHS_MAX = 1024
+_resolved_paths: "OrderedDict[str, str]" = OrderedDict()
+_resolved_paths_lock = threading.Lock()
+
+
+def _get_resolved_path(file_path: str) -> Optional[str]:
+    with _resolved_paths_lock:
+        cached = _resolved_paths.get(file_path)
+        if cached is not None:
+            _resolved_paths.move_to_end(file_path)
+        return cached
+
+
+def _set_resolved_path(file_path: str, resolved: str):
+    with _resolved_paths_lock:
+        _resolved_paths[file_path] = resolved
+        _resolved_paths.move_to_end(file_path)
+        if len(_resolved_paths) > _RESOLVED_PATHS_MAX:
+            _resolved_paths.popitem(last=False)
+
+
+def _forget_resolved_path(file_path: str, resolved: str):
+    """해석해 둔 경로가 resolved일 때만 삭제 (다른 스레드가 새로 저장한 값은 유지)"""
+    with _resolved_paths_lock:
+        if _resolved_paths.get(file_path) == resolved:
+            _resolved_paths.pop(file_path, None)
+
+
+def _candidate_paths(file_path: str):
+    """파일 경로 후보들 (절대경로 또는 이미 해석된 경로면 하나만)"""
+    if os.path.isabs(file_path):
+        yield file_path
+        return
+
+    cached = _get_resolved_path(file_path)
+    if cached is not None:
+        yield cached
+        return
+
+    for base in _POSSIBLE_BASES:
+        yield os.path.join(base, file_path)
+    yield os.path.join(os.getcwd(), file_path)
+
+
+@functools.lru_cache(maxsize=256)
+def _read_lines_cached(path: str, mtime_ns: int, size: int) -> tuple:
+    """(경로, mtime, 크기) 키로 파일 라인 캐시 - 파일이 바뀌면 키가 달라져 자동으로 다시 읽음"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return tuple(f.readlines())
+
+
+def _stat_path(file_path: str) -> Optional[tuple]:
+    """
+    경로 후보를 순서대로 stat 해 (실제 경로, stat 결과) 반환 - 못 찾으면 None
+    exists() 확인 없이 후보마다 stat 한 번만 시도하고 FileNotFoundError면 다음 후보로 넘어갑니다.
+    """
+    for candidate in _candidate_paths(file_path):
+        try:
+            st = os.stat(candidate)
+        except FileNotFoundError:
+            # 해석해 둔 경로가 사라졌으면 다음 호출에서 다시 탐색
+            _forget_resolved_path(file_path, candidate)
+            continue
+        if candidate != file_path:
+            _set_resolved_path(file_path, candidate)
+        return candidate, st
+    return None
+
+
+def _load_lines(file_path: str) -> Optional[tuple]:
+    """
+    (실제 경로, 라인들) 반환 - 못 찾으면 None
+    같은 파일을 여러 턴에서 반복해서 읽는 경우 캐시된 라인을 재사용합니다.
+    """
+    found = _stat_path(file_path)
+    if found is None:
+        return None
+    path, st = found
+    try:
+        return path, _read_lines_cached(path, st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return None
+
+
+# 이 크기를 넘는 파일을 error_line 없이 읽으면 전체를 디코딩하지 않고 앞부분만 잘라 반환
+_LARGE_FILE_BYTES = 512 * 1024
+
+
+def _read_head(path: str, max_lines: int) -> tuple:
+    """mmap에서 앞 max_lines줄 위치까지만 찾아 그 구간만 디코딩 - (내용, 잘렸는지 여부)"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = 0
+        for _ in range(max_lines):
+            newline = mm.find(b'\n', offset)
+            if newline == -1:
+                offset = len(mm)
+                break
+            offset = newline + 1
+        return mm[:offset].decode('utf-8', errors='replace'), offset < len(mm)
+
+
 def read_file(file_path: str, max_lines: int = 2000, error_line: int = None, context_range: int = 50) -> str:
     """
     파일 내용을 읽습니다. 에러 라인이 지정되면 주변 컨텍스트만 반환합니다.
@@ -65,27 +215,23 @@ def read_file(file_path: str, max_lines: int = 2000, error_line: int = None, con
         파일 내용 또는 에러 라인 주변 컨텍스트
     """
     try:
-        # 상대경로를 절대경로로 변환
-        if not os.path.isabs(file_path):
-            possible_bases = [
-                "/Users/fanding/develop/legacy-php-api",
-                "/Users/fanding/develop/ppp",
-                os.getcwd()
-            ]
-
-            found = False
-            for base in possible_bases:
-                full_path = os.path.join(base, file_path)
-                if os.path.exists(full_path):
-                    file_path = full_path
-                    found = True
-                    break
-
-            if not found:
-                return f"ERROR: 파일을 찾을 수 없습니다: {file_path}"
-
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        # 에러 라인 없이 큰 파일을 읽는 경우 - 라인 리스트를 만들지 않고 stat 크기로 먼저 판단
+        if error_line is None or error_line <= 0:
+            found = _stat_path(file_path)
+            if found is not None and found[1].st_size > _LARGE_FILE_BYTES:
+                path, st = found
+                content, truncated = _read_head(path, max_lines)
+                if not truncated:
+                    return content
+                warning = f"\n\n⚠️ 파일이 너무 커서 처음 {max_lines}줄만 표시합니다 (전체: {st.st_size:,}바이트)\n"
+                warning += f"특정 부분이 필요하면 grep_code로 검색하세요.\n"
+                return warning + "\n" + content
+
+        # 상대경로를 절대경로로 변환하며 읽기
+        loaded = _load_lines(file_path)
+        if loaded is None:
+            return f"ERROR: 파일을 찾을 수 없습니다: {file_path}"
+        file_path, lines = loaded
 
         total_lines = len(lines)
 
@@ -94,10 +240,11 @@ def read_file(file_path: str, max_lines: int = 2000, error_line: int = None, con
             start = max(0, error_line - context_range - 1)
             end = min(total_lines, error_line + context_range)
 
+            # 캐시된 라인에서 필요한 구간만 순회 (복사 없이)
             context_lines = []
-            for i in range(start, end):
-                line_marker = ">>> 🔥 " if (i + 1) == error_line else "     "
-                context_lines.append(f"{line_marker}{i+1:4d} | {lines[i].rstrip()}")
+            for line_no, line in enumerate(itertools.islice(lines, start, end), start + 1):
+                line_marker = ">>> 🔥 " if line_no == error_line else "     "
+                context_lines.append(f"{line_marker}{line_no:4d} | {line.rstrip()}")
 
             context = "\n".join(context_lines)
             header = f"📄 파일: {os.path.basename(file_path)}\n"
@@ -113,7 +260,7 @@ def read_file(file_path: str, max_lines: int = 2000, error_line: int = None, con
         # 에러 라인이 없으면 기존 방식대로
         # 파일이 너무 크면 잘라서 반환
         if total_lines > max_lines:
-            content = ''.join(lines[:max_lines])
+            content = ''.join(itertools.islice(lines, max_lines))
             warning = f"\n\n⚠️ 파일이 너무 커서 처음 {max_lines}줄만 표시합니다 (전체: {total_lines}줄)\n"
             warning += f"특정 부분이 필요하면 grep_code로 검색하세요.\n"
             return warning + "\n" + content
@@ -124,6 +271,18 @@ def read_file(file_path: str, max_lines: int = 2000, error_line: int = None, con
         return f"ERROR: 파일 읽기 실패: {str(e)}"
 
 
+# search_files 최대 결과 수
+SEARCH_FILES_LIMIT = 50
+# search_files에서 내려가지 않는 디렉토리 (의존성 - 숨김 디렉토리는 별도로 제외)
+_SEARCH_SKIP_DIRS = frozenset({"node_modules", "vendor"})
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_name_pattern(pattern: str):
+    """파일명 패턴(fnmatch)을 정규식 match 함수로 변환 - 패턴별로 한 번만 컴파일"""
+    return re.compile(fnmatch.translate(pattern)).match
+
+
 def search_files(directory: str, pattern: str = "*.php") -> str:
     """
     디렉토리에서 특정 패턴의 파일들을 검색합니다.
@@ -136,20 +295,40 @@ def search_files(directory: str, pattern: str = "*.php") -> str:
         검색된 파일 목록 (JSON 문자열)
     """
     try:
-        import glob
-
         if not os.path.isabs(directory):
             directory = os.path.abspath(directory)
 
-        search_pattern = os.path.join(directory, "**", pattern)
-        files = glob.glob(search_pattern, recursive=True)
-
-        # 최대 50개로 제한
-        result = files[:50]
-        return json.dumps(result, ensure_ascii=False)
+        # 경로가 포함된 패턴은 파일명 매칭으로 처리할 수 없으므로 glob 사용
+        if "/" in pattern:
+            search_pattern = os.path.join(directory, "**", pattern)
+            files = glob.glob(search_pattern, recursive=True)
+            return orjson.dumps(files[:SEARCH_FILES_LIMIT]).decode()
+
+        # 파일명 패턴만 매칭하고, 결과가 50개 차면 탐색 중단
+        match = _compile_name_pattern(pattern)
+        result = []
+        stack = [directory]
+        while stack and len(result) < SEARCH_FILES_LIMIT:
+            try:
+                it = os.scandir(stack.pop())
+            except OSError:
+                # glob과 동일하게 접근 불가 디렉토리는 건너뜀
+                continue
+            with it:
+                for entry in it:
+                    if entry.name.startswith("."):
+                        continue
+                    if match(entry.name):
+                        result.append(entry.path)
+                        if len(result) >= SEARCH_FILES_LIMIT:
+                            break
+                    if entry.is_dir(follow_symlinks=False) and entry.name not in _SEARCH_SKIP_DIRS:
+                        stack.append(entry.path)
+
+        return orjson.dumps(result).decode()
 
     except Exception as e:
-        return json.dumps([f"ERROR: {str(e)}"], ensure_ascii=False)
+        return orjson.dumps([f"ERROR: {str(e)}"]).decode()
 
 
 def grep_code(file_path: str, search_term: str, max_results: int = 10) -> str:
@@ -165,17 +344,18 @@ def grep_code(file_path: str, search_term: str, max_results: int = 10) -> str:
         검색 결과 (라인 번호와 내용)
     """
     try:
-        # 파일을 작게 읽기 (최대 1000줄)
-        content = read_file(file_path, max_lines=1000)
-
-        if content.startswith("ERROR"):
-            return content
-
-        lines = content.split('\n')
+        loaded = _load_lines(file_path)
+        if loaded is None:
+            return f"ERROR: 파일을 찾을 수 없습니다: {file_path}"
+
+        # 캐시된 라인에서 바로 검색 (최대 1000줄, 복사 없이 순회)
+        lines = itertools.islice(loaded[1], 1000)
+        # 대소문자 무시 리터럴 검색 - 라인마다 lower() 복사본을 만들지 않음
+        needle = re.compile(re.escape(search_term), re.IGNORECASE).search
         results = []
 
         for i, line in enumerate(lines, 1):
-            if search_term.lower() in line.lower():
+            if needle(line):
                 # 라인을 짧게 자르기 (최대 150자)
                 trimmed = line.strip()[:150]
                 results.append(f"Line {i}: {trimmed}")
@@ -207,7 +387,7 @@ def list_directory(directory: str) -> str:
             directory = os.path.abspath(directory)
 
         if not os.path.exists(directory):
-            return json.dumps({"error": f"디렉토리가 존재하지 않습니다: {directory}"})
+            return orjson.dumps({"error": f"디렉토리가 존재하지 않습니다: {directory}"}).decode()
 
         items = []
         for item in os.listdir(directory):
@@ -218,118 +398,141 @@ def list_directory(directory: str) -> str:
                 "is_dir": os.path.isdir(item_path)
             })
 
-        return json.dumps(items, ensure_ascii=False)
+        return orjson.dumps(items).decode()
 
     except Exception as e:
-        return json.dumps({"error": str(e)}, ensure_ascii=False)
-
-
-# FastMCP 툴들을 OpenAI function calling 형식으로 변환
-def get_openai_tools():
-    """FastMCP 툴들을 OpenAI function calling 형식으로 변환"""
-    return [
-        {
-            "type": "function",
-            "function": {
-                "name": "read_file",
-                "description": "파일의 내용을 읽습니다. error_line이 지정되면 해당 라인 주변만 반환하여 토큰을 절약합니다.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "읽을 파일의 경로 (절대경로 또는 상대경로)"
-                        },
-                        "error_line": {
-                            "type": "integer",
-                            "description": "에러가 발생한 라인 번호 (지정 시 주변 ±50줄만 반환)"
-                        }
+        return orjson.dumps({"error": str(e)}).decode()
+
+
+# FastMCP 툴들을 OpenAI function calling 형식으로 변환 (모듈 로드 시 한 번만 생성)
+_OPENAI_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "read_file",
+            "description": "파일의 내용을 읽습니다. error_line이 지정되면 해당 라인 주변만 반환하여 토큰을 절약합니다.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "읽을 파일의 경로 (절대경로 또는 상대경로)"
                     },
-                    "required": ["file_path"]
-                }
+                    "error_line": {
+                        "type": "integer",
+                        "description": "에러가 발생한 라인 번호 (지정 시 주변 ±50줄만 반환)"
+                    }
+                },
+                "required": ["file_path"]
             }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "search_files",
-                "description": "디렉토리에서 특정 패턴의 파일들을 검색합니다. 관련 파일을 찾을 때 사용하세요.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "directory": {
-                            "type": "string",
-                            "description": "검색할 디렉토리 경로"
-                        },
-                        "pattern": {
-                            "type": "string",
-                            "description": "파일 패턴 (예: *.php, *.py, UserController.php)",
-                            "default": "*.php"
-                        }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_files",
+            "description": "디렉토리에서 특정 패턴의 파일들을 검색합니다. 관련 파일을 찾을 때 사용하세요.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "directory": {
+                        "type": "string",
+                        "description": "검색할 디렉토리 경로"
                     },
-                    "required": ["directory"]
-                }
+                    "pattern": {
+                        "type": "string",
+                        "description": "파일 패턴 (예: *.php, *.py, UserController.php)",
+                        "default": "*.php"
+                    }
+                },
+                "required": ["directory"]
             }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "grep_code",
-                "description": "파일에서 특정 코드나 함수를 검색합니다. 함수 정의나 클래스를 찾을 때 사용하세요.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "file_path": {
-                            "type": "string",
-                            "description": "검색할 파일 경로"
-                        },
-                        "search_term": {
-                            "type": "string",
-                            "description": "검색할 코드 (함수명, 클래스명, 변수명 등)"
-                        }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "grep_code",
+            "description": "파일에서 특정 코드나 함수를 검색합니다. 함수 정의나 클래스를 찾을 때 사용하세요.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "검색할 파일 경로"
                     },
-                    "required": ["file_path", "search_term"]
-                }
+                    "search_term": {
+                        "type": "string",
+                        "description": "검색할 코드 (함수명, 클래스명, 변수명 등)"
+                    }
+                },
+                "required": ["file_path", "search_term"]
             }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "list_directory",
-                "description": "디렉토리의 파일과 폴더 목록을 반환합니다. 프로젝트 구조를 파악할 때 사용하세요.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "directory": {
-                            "type": "string",
-                            "description": "조회할 디렉토리 경로"
-                        }
-                    },
-                    "required": ["directory"]
-                }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "list_directory",
+            "description": "디렉토리의 파일과 폴더 목록을 반환합니다. 프로젝트 구조를 파악할 때 사용하세요.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "directory": {
+                        "type": "string",
+                        "description": "조회할 디렉토리 경로"
+                    }
+                },
+                "required": ["directory"]
             }
         }
-    ]
+    }
+]
+
+
+def get_openai_tools():
+    """FastMCP 툴들을 OpenAI function calling 형식으로 변환"""
+    return _OPENAI_TOOLS
+
+
+# 툴 이름 → 실행 함수
+_TOOL_DISPATCH = {
+    "read_file": lambda args: read_file(args["file_path"], error_line=args.get("error_line")),
+    "search_files": lambda args: search_files(args["directory"], args.get("pattern", "*.php")),
+    "grep_code": lambda args: grep_code(args["file_path"], args["search_term"]),
+    "list_directory": lambda args: list_directory(args["directory"]),
+}
 
 
 def execute_tool(tool_name: str, arguments: dict) -> str:
     """툴 실행"""
-    if tool_name == "read_file":
-        error_line = arguments.get("error_line")
-        return read_file(arguments["file_path"], error_line=error_line)
-    elif tool_name == "search_files":
-        pattern = arguments.get("pattern", "*.php")
-        return search_files(arguments["directory"], pattern)
-    elif tool_name == "grep_code":
-        return grep_code(arguments["file_path"], arguments["search_term"])
-    elif tool_name == "list_directory":
-        return list_directory(arguments["directory"])
-    else:
+    handler = _TOOL_DISPATCH.get(tool_name)
+    if handler is None:
         return f"ERROR: 알 수 없는 툴: {tool_name}"
+    return handler(arguments)
 
 
 # ========== Helper Functions ==========
 
+# 스택 트레이스 파일 위치 - Python(그룹 1~3) / PHP(그룹 4~5)를 하나의 alternation으로 한 번에 스캔
+# PHP 쪽은 경로 문자열 중간에서 매칭을 다시 시도하지 않도록 lookbehind로 시작점 고정 (선형 시간)
+_LOC_RE = re.compile(
+    r'File\s+"([^"]+)",\s+line\s+(\d+)(?:,\s+in\s+(\w+))?'
+    r'|(?<![/\w\-.])([/\w\-.]+\.php)[(:]+(\d+)\)?'
+)
+# 추출할 최대 파일 위치 수 (앞쪽 프레임만 분석에 사용)
+_MAX_FILE_LOCATIONS = 20
+# 비정상적으로 큰 스택 트레이스는 앞부분만 파싱
+_MAX_TRACE_CHARS = 64 * 1024
+# 에러 원인 분석 대상이 아닌 프레임워크/엔트리 파일 프레임
+_EXCLUDE_RE = re.compile(r'/(?:system|vendor|core|bootstrap)/|/(?:CodeIgniter|index)\.php')
+# 프롬프트용 인사이트 추출에 사용할 최대 프레임(비어 있지 않은 라인) 수
+_MAX_TRACE_FRAMES = 40
+# 함수 호출과 실제 인자 (한 줄 안에서 첫 `)`까지 - `.*?` 대신 부정 문자 클래스로 백트래킹 제거)
+_ARG_RE = re.compile(r'(\w+)\(([^)\n]*)\)')
+# 타입 에러 (예: "must be of the type int, string given")
+_TYPE_RE = re.compile(r'must be of the type (\w+), (\w+) given')
+
 def _extract_stack_trace_insights(stack_trace: str) -> dict:
     """
     스택 트레이스에서 중요한 정보를 추출합니다.
@@ -343,10 +546,13 @@ def _extract_stack_trace_insights(stack_trace: str) -> dict:
         "type_errors": []
     }
 
+    # 앞쪽 프레임만 분석 (프롬프트에 들어가는 인자 목록이 트레이스 길이에 비례해 커지지 않도록)
+    frames = [line for line in stack_trace.splitlines() if line.strip()]
+    stack_trace = "\n".join(frames[:_MAX_TRACE_FRAMES])
+
     # PHP 함수 호출에서 실제 인자 값 추출
     # 예: __construct('POST_10738', '1746', 'yes', 'invalid_price')
-    arg_pattern = r'(\w+)\((.*?)\)'
-    for match in re.finditer(arg_pattern, stack_trace):
+    for match in _ARG_RE.finditer(stack_trace):
         function_name = match.group(1)
         args_str = match.group(2)
 
@@ -362,8 +568,7 @@ def _extract_stack_trace_insights(stack_trace: str) -> dict:
 
     # 타입 에러 정보 추출
     # 예: "must be of the type int, string given"
-    type_pattern = r'must be of the type (\w+), (\w+) given'
-    type_match = re.search(type_pattern, stack_trace)
+    type_match = _TYPE_RE.search(stack_trace)
     if type_match:
         insights["type_errors"].append({
             "expected": type_match.group(1),
@@ -373,38 +578,288 @@ def _extract_stack_trace_insights(stack_trace: str) -> dict:
     return insights
 
 def _extract_file_locations(stack_trace: str, base_path: str) -> List[dict]:
-    """스택 트레이스에서 파일 위치 정보 추출"""
+    """스택 트레이스에서 파일 위치 정보 추출 (Python/PHP 프레임을 한 번의 스캔으로, 트레이스 순서대로)"""
     locations = []
+    framework_locations = []  # 프레임워크/벤더 프레임 (앱 프레임이 없을 때만 사용)
+    seen = set()  # 같은 프레임이 여러 줄에 나와도 한 번만
 
-    # Python 스타일
-    python_pattern = r'File\s+"([^"]+)",\s+line\s+(\d+)(?:,\s+in\s+(\w+))?'
-    python_matches = re.findall(python_pattern, stack_trace)
-
-    for match in python_matches:
-        file_path, line_num, function = match
-        if base_path in file_path or os.path.isabs(file_path):
-            locations.append({
+    for match in _LOC_RE.finditer(stack_trace[:_MAX_TRACE_CHARS]):
+        py_file, py_line, function, php_file, php_line = match.groups()
+        if py_file:
+            key = (py_file, int(py_line), 'python')
+        else:
+            key = (php_file, int(php_line), 'php')
+        if key in seen:
+            continue
+        seen.add(key)
+
+        file_path, line_num, language = key
+        # 저렴한 절대 경로 검사를 먼저 - 대부분의 프레임은 부분 문자열 검색 없이 통과
+        if not (os.path.isabs(file_path) or base_path in file_path):
+            continue
+
+        is_framework = language == 'php' and _EXCLUDE_RE.search(file_path)
+        target = framework_locations if is_framework else locations
+        if len(target) < _MAX_FILE_LOCATIONS:
+            target.append({
                 'file': file_path,
-                'line': int(line_num),
-                'function': function if function else None,
-                'language': 'python'
+                'line': line_num,
+                'function': function or None,
+                'language': language
             })
+        # 다운스트림은 앞쪽 프레임만 사용하므로 충분히 모이면 스캔 종료
+        if len(locations) >= _MAX_FILE_LOCATIONS:
+            break
 
-    # PHP 스타일
-    php_pattern = r'([/\w\-\.]+\.php)[\(:]+(\d+)\)?'
-    php_matches = re.findall(php_pattern, stack_trace)
+    return locations or framework_locations
 
-    for match in php_matches:
-        file_path, line_num = match
-        if base_path in file_path or os.path.isabs(file_path):
-            locations.append({
-                'file': file_path,
-                'line': int(line_num),
-                'function': None,
-                'language': 'php'
-            })
 
-    return locations
+# 고정 시스템 프롬프트 - 요청별 값(경로, 에러 라인 등)을 넣지 않아
+# 시스템 + 툴 스키마 prefix가 모든 요청/반복에서 동일하게 유지됨 (OpenAI 프롬프트 캐시 적중)
+_SYSTEM_PROMPT = """전문 PHP 디버거. **절대 규칙: grep_code 사용 금지!** read_file만 사용하고 error_line 파라미터 필수. 2-3개 파일만 읽고 즉시 분석 완료.
+
+**임무 (3단계만):**
+1. 에러 파일 읽기: 사용자 메시지의 1단계 read_file 호출 그대로 사용
+2. 호출된 메서드 파일 읽기 (1개만): 보통 model_post.php 같은 파일
+   - **큰 파일이므로 read_file만 사용** (grep_code ❌)
+3. **즉시 분석 완료** - 위 2개 파일만으로 충분!
+
+**절대 금지:**
+❌ grep_code 사용 금지 (파일이 너무 커서 비효율적)
+❌ search_files 사용 금지
+❌ 3개 이상 파일 읽기 금지
+
+**목표:** read_file 2-3회만 호출하고 바로 최종 분석!
+
+## 분석 결과 형식 (간결하게!)
+
+### 🎯 원인 분석
+**에러 위치:**
+- 파일: Post.php:851
+- 메서드: [메서드명]
+- 코드: `[실제 코드 한 줄]`
+
+**왜 에러가 났는가:**
+1. [에러 라인에서 무엇을 했는지] (예: `getPostViewDataWithBadTypes()` 호출)
+2. [그 메서드/함수가 무엇을 반환했는지] (예: DB 쿼리 결과 - `CONCAT('POST_', no)`)
+3. [왜 타입이 안 맞는지] (예: CONCAT은 문자열 반환, 생성자는 int 요구)
+
+**해결 방법:**
+- 한 줄 수정: `[구체적인 코드 수정]` (예: `(int)$badData['post_no']`)
+
+**간결하게! 사족 없이 핵심만!**
+"""
+
+# 원문을 유지할 최근 툴 결과 수 (더 오래된 결과는 한 줄 요약으로 대체해 입력 토큰 절감)
+_KEEP_RECENT_TOOL_RESULTS = 4
+
+
+def _compact_messages(messages: list, call_args: dict) -> list:
+    """오래된 tool 결과를 한 줄 요약으로 바꾼 전송용 messages 사본 (원본 messages는 그대로)"""
+    tool_indices = [i for i, m in enumerate(messages) if m["role"] == "tool"]
+    old = set(tool_indices[:-_KEEP_RECENT_TOOL_RESULTS])
+    if not old:
+        return messages
+
+    compacted = []
+    for i, msg in enumerate(messages):
+        if i in old:
+            args = call_args.get(msg["tool_call_id"], {})
+            target = args.get("file_path") or args.get("directory") or ""
+            msg = {
+                **msg,
+                "content": f"[이전 {msg['name']}({target}) 결과 {len(msg['content'])}자 - 생략됨, 필요하면 다시 호출]"
+            }
+        compacted.append(msg)
+    return compacted
+
+
+# 완성된 최종 분석으로 판단하는 헤더 (_SYSTEM_PROMPT의 결과 형식)
+_FINAL_ANALYSIS_MARKERS = ("### 🎯 원인 분석", "**해결 방법:**")
+
+
+class TokenBucket:
+    """
+    분당 요청 수(RPM) / 토큰 수(TPM) 한도에 맞춰 호출을 미리 대기시키는 토큰 버킷.
+    429를 받고 백오프하는 대신 한도를 넘기 전에 기다립니다.
+    """
+
+    def __init__(self, requests_per_min: int, tokens_per_min: int):
+        # 0/음수 한도는 보충 속도가 0 이하가 되어 영원히 대기하거나 0으로 나누므로 최소 1
+        requests_per_min = max(1, requests_per_min)
+        tokens_per_min = max(1, tokens_per_min)
+        self.requests_per_min = requests_per_min
+        self.tokens_per_min = tokens_per_min
+        self._requests = float(requests_per_min)
+        self._tokens = float(tokens_per_min)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_min, self._requests + elapsed * self.requests_per_min / 60)
+        self._tokens = min(self.tokens_per_min, self._tokens + elapsed * self.tokens_per_min / 60)
+
+    async def acquire(self, estimated_tokens: int) -> int:
+        """요청 1개 + estimated_tokens를 예약하고 실제로 예약한 토큰 수 반환 (refund 기준)"""
+        # 버킷보다 큰 요청이 영원히 대기하지 않도록 상한
+        estimated_tokens = min(estimated_tokens, self.tokens_per_min)
+        # 대기 중에도 락을 잡아 도착 순서대로 처리
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= estimated_tokens:
+                    self._requests -= 1
+                    self._tokens -= estimated_tokens
+                    return estimated_tokens
+                await asyncio.sleep(max(
+                    (1 - self._requests) * 60 / self.requests_per_min,
+                    (estimated_tokens - self._tokens) * 60 / self.tokens_per_min
+                ))
+
+    def refund(self, tokens: int):
+        """예약했지만 실제로 쓰지 않은 토큰을 버킷에 돌려줌 (대기 중인 acquire는 다음 확인 때 반영)"""
+        if tokens <= 0:
+            return
+        self._refill()
+        self._tokens = min(self.tokens_per_min, self._tokens + tokens)
+
+
+def _positive_int_env(name: str, default: int) -> int:
+    """양의 정수 환경 변수 - 비어 있거나 숫자가 아니면 기본값, 0 이하면 1"""
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return max(1, int(value))
+    except ValueError:
+        log.warning("⚠️ %s=%r는 정수가 아닙니다 - 기본값 %d 사용", name, value, default)
+        return default
+
+
+# 계정 티어의 gpt-4.1-mini 한도에 맞춰 조정
+openai_rate_limiter = TokenBucket(
+    requests_per_min=_positive_int_env("OPENAI_RPM", 500),
+    tokens_per_min=_positive_int_env("OPENAI_TPM", 200000)
+)
+
+
+def _estimate_tokens(messages: list) -> int:
+    """프롬프트 토큰 수 추정 (한글 비중이 높아 보수적으로 2자당 1토큰)"""
+    chars = 0
+    for message in messages:
+        chars += len(message.get("content") or "")
+        for tc in message.get("tool_calls") or []:
+            chars += len(tc["function"]["arguments"])
+    return chars // 2
+
+
+async def _stream_chat(on_event=None, **kwargs):
+    """
+    chat.completions를 stream=True로 호출해 델타를 조립합니다.
+    content 토큰은 도착하는 대로 on_event로 전달하고, (message, usage)를 반환합니다.
+    message는 비스트리밍 응답의 choices[0].message와 같은 속성(content, tool_calls)을 가집니다.
+    """
+    # max_tokens까지 예약하고, 스트림이 끝나면 실제 사용량과의 차이를 돌려줌
+    reserved_tokens = await openai_rate_limiter.acquire(
+        _estimate_tokens(kwargs["messages"]) + kwargs.get("max_tokens", 0)
+    )
+    stream = await openai_client.chat.completions.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs
+    )
+
+    content_parts = []
+    tool_calls = {}  # index → 조립 중인 tool_call
+    usage = None
+    async for chunk in stream:
+        if chunk.usage:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+            if on_event:
+                await on_event({"type": "token", "content": delta.content})
+        for tc in delta.tool_calls or []:
+            slot = tool_calls.setdefault(
+                tc.index,
+                SimpleNamespace(id=None, function=SimpleNamespace(name="", arguments=""))
+            )
+            if tc.id:
+                slot.id = tc.id
+            if tc.function:
+                slot.function.name += tc.function.name or ""
+                slot.function.arguments += tc.function.arguments or ""
+
+    message = SimpleNamespace(
+        content="".join(content_parts) or None,
+        tool_calls=[tool_calls[i] for i in sorted(tool_calls)]
+    )
+    if usage:
+        openai_rate_limiter.refund(reserved_tokens - (usage.prompt_tokens + usage.completion_tokens))
+    return message, usage
+
+
+# 값을 항상 문자열로 만드는 표현 (에러 라인에 있으면 숫자 타입 불일치의 원인이 명확)
+_STRINGIFY_MARKERS = ("CONCAT(", "(string)")
+
+
+def _fast_path_type_error(error_message: str, stack_insights: dict) -> Optional[dict]:
+    """fast path가 다루는 문자열 → 숫자 타입 에러면 {"expected", "actual"} 반환, 아니면 None"""
+    type_errors = stack_insights["type_errors"]
+    if not type_errors:
+        type_match = _TYPE_RE.search(error_message)
+        if not type_match:
+            return None
+        type_errors = [{"expected": type_match.group(1), "actual": type_match.group(2)}]
+
+    te = type_errors[0]
+    if te["expected"] not in ("int", "float") or te["actual"] != "string":
+        return None
+    return te
+
+
+def _try_fast_path(
+    error_message: str,
+    stack_insights: dict,
+    file_location: dict,
+    source_line: Optional[str]
+) -> Optional[str]:
+    """
+    원인이 에러 라인 한 줄로 명확한 타입 에러면 LLM 없이 분석 결과를 만듭니다.
+    해당하지 않으면 None (에이전트 루프로 진행)
+    """
+    if not source_line:
+        return None
+
+    te = _fast_path_type_error(error_message, stack_insights)
+    if te is None:
+        return None
+
+    marker = next((m for m in _STRINGIFY_MARKERS if m in source_line), None)
+    if marker is None:
+        return None
+
+    code = source_line.strip()
+    return f"""### 🎯 원인 분석
+**에러 위치:**
+- 파일: {os.path.basename(file_location['file'])}:{file_location['line']}
+- 코드: `{code}`
+
+**왜 에러가 났는가:**
+1. 에러 라인에서 `{marker}`로 값을 만들어 전달
+2. `{marker}`의 결과는 항상 문자열 ({te['actual']})
+3. 받는 쪽은 {te['expected']} 타입을 요구하므로 TypeError 발생
+
+**해결 방법:**
+- 한 줄 수정: 전달하는 값을 `({te['expected']})`로 캐스트하거나, `{marker}` 대신 원래 숫자 값을 그대로 전달
+"""
 
 
 async def _analyze_with_ai_agent(
@@ -414,15 +869,42 @@ async def _analyze_with_ai_agent(
     file_locations: List[dict],
     error_line: int = None,
     input_params: Optional[str] = None,
-    server_base_path: str = "/Users/fanding/develop/legacy-php-api"
+    server_base_path: str = "/Users/fanding/develop/legacy-php-api",
+    on_event=None
 ) -> dict:
     """
     AI 에이전트가 FastMCP 툴을 사용하며 비즈니스 로직까지 분석합니다.
+    on_event가 주어지면 진행 상황(반복, 툴 호출)과 응답 토큰을 스트리밍으로 전달합니다.
     """
 
     # 스택 트레이스 분석
     stack_insights = _extract_stack_trace_insights(stack_trace)
 
+    # 에러 라인만으로 원인이 명확하면 LLM 호출 없이 바로 결과 반환
+    # (fast path 대상 타입 에러일 때만 에러 라인을 미리 읽음)
+    source_line = None
+    if file_locations and error_line and _fast_path_type_error(error_message, stack_insights):
+        try:
+            loaded = await asyncio.to_thread(_load_lines, file_locations[0]["file"])
+        except (OSError, UnicodeDecodeError):
+            # 디렉토리/권한 없음/UTF-8이 아닌 파일은 fast path 없이 에이전트 루프로
+            loaded = None
+        if loaded and 0 < error_line <= len(loaded[1]):
+            source_line = loaded[1][error_line - 1]
+    fast_analysis = _try_fast_path(error_message, stack_insights, file_locations[0], source_line)
+    if fast_analysis:
+        return {
+            "analysis": fast_analysis,
+            "tool_calls": [],
+            "iterations": 0,
+            "fast_path": True,
+            "token_usage": {
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "total_tokens": 0
+            }
+        }
+
     # 실제 인자 값 강조
     actual_args_info = ""
     if stack_insights["actual_arguments"]:
@@ -439,51 +921,23 @@ async def _analyze_with_ai_agent(
         te = stack_insights["type_errors"][0]
         type_error_info = f"**타입 불일치:** 예상={te['expected']}, 실제={te['actual']}\n"
 
-    # 초기 컨텍스트 (간결하게!)
+    # 초기 컨텍스트 (간결하게!) - 요청마다 바뀌는 값만 담고 고정 지침은 _SYSTEM_PROMPT로
     initial_context = f"""PHP 에러 디버깅. 빠르고 간결하게!
 
 **에러:** {error_type}
 **메시지:** {error_message}
 {type_error_info}**에러 라인:** {error_line if error_line else "확인 필요"}
 {actual_args_info}
-**임무 (3단계만):**
-1. 에러 파일 읽기: `read_file(file_path="{server_base_path}/application/controllers/rest/Post.php", error_line={error_line})`
-2. 호출된 메서드 파일 읽기 (1개만): 보통 model_post.php 같은 파일
-   - **큰 파일이므로 read_file만 사용** (grep_code ❌)
-3. **즉시 분석 완료** - 위 2개 파일만으로 충분!
-
-**절대 금지:**
-❌ grep_code 사용 금지 (파일이 너무 커서 비효율적)
-❌ search_files 사용 금지
-❌ 3개 이상 파일 읽기 금지
-
-**목표:** read_file 2-3회만 호출하고 바로 최종 분석!
-
-## 분석 결과 형식 (간결하게!)
-
-### 🎯 원인 분석
-**에러 위치:**
-- 파일: Post.php:851
-- 메서드: [메서드명]
-- 코드: `[실제 코드 한 줄]`
-
-**왜 에러가 났는가:**
-1. [에러 라인에서 무엇을 했는지] (예: `getPostViewDataWithBadTypes()` 호출)
-2. [그 메서드/함수가 무엇을 반환했는지] (예: DB 쿼리 결과 - `CONCAT('POST_', no)`)
-3. [왜 타입이 안 맞는지] (예: CONCAT은 문자열 반환, 생성자는 int 요구)
-
-**해결 방법:**
-- 한 줄 수정: `[구체적인 코드 수정]` (예: `(int)$badData['post_no']`)
-
-**간결하게! 사족 없이 핵심만!**
+**1단계 (에러 파일 읽기):** `read_file(file_path="{server_base_path}/application/controllers/rest/Post.php", error_line={error_line})`
 """
 
     messages = [
-        {"role": "system", "content": "전문 PHP 디버거. **절대 규칙: grep_code 사용 금지!** read_file만 사용하고 error_line 파라미터 필수. 2-3개 파일만 읽고 즉시 분석 완료."},
+        {"role": "system", "content": _SYSTEM_PROMPT},
         {"role": "user", "content": initial_context}
     ]
 
     tool_calls_history = []
+    call_args = {}  # tool_call_id → 인자 (오래된 결과 요약용)
     max_iterations = 8  # 최대 8번 반복 (여유 있게)
 
     # 토큰 사용량 추적
@@ -493,6 +947,9 @@ async def _analyze_with_ai_agent(
 
     for iteration in range(max_iterations):
         try:
+            if on_event:
+                await on_event({"type": "iteration", "iteration": iteration + 1})
+
             # 4번째 반복부터는 툴 사용 중단하고 분석 요청
             if iteration >= 4:
                 # 강제로 최종 분석 유도
@@ -500,33 +957,35 @@ async def _analyze_with_ai_agent(
                     "role": "user",
                     "content": "충분한 파일을 읽었습니다. 이제 툴 호출 없이 **즉시 최종 분석**을 작성하세요!"
                 })
-                response = openai_client.chat.completions.create(
+                assistant_message, usage = await _stream_chat(
+                    on_event,
                     model="gpt-4.1-mini",
-                    messages=messages,
+                    messages=_compact_messages(messages, call_args),
                     temperature=0.3,
                     max_tokens=4000
                 )
             else:
-                # OpenAI API 호출
-                response = openai_client.chat.completions.create(
+                # OpenAI API 호출 (스트리밍 - 생성되는 대로 수신)
+                assistant_message, usage = await _stream_chat(
+                    on_event,
                     model="gpt-4.1-mini",
-                    messages=messages,
-                    tools=get_openai_tools(),
+                    messages=_compact_messages(messages, call_args),
+                    tools=_OPENAI_TOOLS,
                     tool_choice="auto",
                     temperature=0.3,
                     max_tokens=4000
                 )
 
             # 토큰 사용량 누적
-            if hasattr(response, 'usage'):
-                total_input_tokens += response.usage.prompt_tokens
-                total_output_tokens += response.usage.completion_tokens
-                total_tokens += response.usage.total_tokens
-
-            assistant_message = response.choices[0].message
-
-            # 툴 호출이 없으면 최종 답변
-            if not assistant_message.tool_calls:
+            if usage is not None:
+                total_input_tokens += usage.prompt_tokens
+                total_output_tokens += usage.completion_tokens
+                total_tokens += usage.total_tokens
+
+            # 툴 호출이 없거나, 이미 완성된 최종 분석이면 추가 라운드 없이 최종 답변
+            content = assistant_message.content or ""
+            is_final = all(marker in content for marker in _FINAL_ANALYSIS_MARKERS)
+            if not assistant_message.tool_calls or is_final:
                 return {
                     "analysis": assistant_message.content,
                     "tool_calls": tool_calls_history,
@@ -555,13 +1014,23 @@ async def _analyze_with_ai_agent(
                 ]
             })
 
-            for tool_call in assistant_message.tool_calls:
+            # 같은 턴의 툴 호출들은 서로 독립적이므로 워커 스레드에서 동시에 실행
+            parsed_calls = [
+                (tool_call, orjson.loads(tool_call.function.arguments))
+                for tool_call in assistant_message.tool_calls
+            ]
+            if on_event:
+                for tool_call, function_args in parsed_calls:
+                    await on_event({"type": "tool", "tool": tool_call.function.name, "arguments": function_args})
+            tool_results = await asyncio.gather(*[
+                asyncio.to_thread(execute_tool, tool_call.function.name, function_args)
+                for tool_call, function_args in parsed_calls
+            ])
+
+            # 결과는 tool_calls 순서대로 메시지에 추가
+            for (tool_call, function_args), tool_result in zip(parsed_calls, tool_results):
                 function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
-
-                # 툴 실행
-                tool_result = execute_tool(function_name, function_args)
-
+                call_args[tool_call.id] = function_args
                 # 히스토리 저장
                 tool_calls_history.append({
                     "tool": function_name,
@@ -611,6 +1080,48 @@ async def _analyze_with_ai_agent(
 
 # ========== FastAPI Endpoints ==========
 
+# 툴 실행(파일 I/O) 워커 스레드 수 - 동시 /analyze 요청의 툴 호출이 기본 풀 크기(min(32, CPU+4))에 막히지 않도록
+_TOOL_THREAD_WORKERS = 64
+# FastAPI 동기 엔드포인트용 anyio 스레드 토큰 수 (기본 40)
+_ANYIO_THREAD_TOKENS = 200
+
+
+@app.on_event("startup")
+async def startup_event():
+    """서버 시작 시 로깅 설정 및 스레드 풀 크기 조정"""
+    global _log_listener
+    # 요청 처리 경로 로그 레벨은 MCP_LOG_LEVEL로 조정 (기본 INFO, DEBUG 덤프는 기본 비활성)
+    if _log_listener is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        log_queue = queue.Queue(-1)
+        log.addHandler(logging.handlers.QueueHandler(log_queue))
+        log.propagate = False
+        level = os.getenv("MCP_LOG_LEVEL", "INFO").upper()
+        if level in logging.getLevelNamesMapping():
+            log.setLevel(level)
+        else:
+            # 오타 등 알 수 없는 레벨로 서버가 시작하지 못하는 일이 없도록 INFO로 대체
+            log.setLevel(logging.INFO)
+            log.warning("⚠️ 알 수 없는 MCP_LOG_LEVEL=%r - INFO로 대체합니다", level)
+        _log_listener = logging.handlers.QueueListener(log_queue, handler)
+        _log_listener.start()
+
+    # asyncio.to_thread(execute_tool, ...)가 사용하는 기본 executor
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=_TOOL_THREAD_WORKERS, thread_name_prefix="tool")
+    )
+    anyio.to_thread.current_default_thread_limiter().total_tokens = _ANYIO_THREAD_TOKENS
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """서버 종료 시 공유 HTTP 클라이언트 정리 및 남은 로그 기록"""
+    await openai_client.close()
+    if _log_listener is not None:
+        _log_listener.stop()
+
+
 @app.get("/health")
 def health_check():
     """헬스 체크"""
@@ -621,8 +1132,38 @@ def health_check():
     }
 
 
+# 진행 중인 분석 (요청 키 → Task) - 같은 에러가 연달아 들어오면 에이전트 루프 한 번을 공유
+_inflight_analyses: dict = {}
+
+
+def _analysis_key(request: ErrorRequest) -> tuple:
+    """동일한 분석으로 간주할 요청 키"""
+    return (
+        request.error_type,
+        request.error_message,
+        request.stack_trace,
+        request.input_params,
+        request.server_base_path,
+    )
+
+
 @app.post("/analyze")
 async def analyze_error(request: ErrorRequest):
+    """AI 에이전트 분석 - 같은 에러가 동시에 들어오면 분석 한 번을 공유"""
+    key = _analysis_key(request)
+    task = _inflight_analyses.get(key)
+    if task is None:
+        task = asyncio.create_task(_run_analysis(request))
+        _inflight_analyses[key] = task
+        task.add_done_callback(lambda _: _inflight_analyses.pop(key, None))
+    else:
+        log.info("♻️ 동일한 에러 분석이 진행 중 - 결과 공유 (타입: %s)", request.error_type)
+
+    # 한 요청이 끊겨도 공유 중인 분석은 취소되지 않도록 shield
+    return await asyncio.shield(task)
+
+
+async def _run_analysis(request: ErrorRequest):
     """
     AI 에이전트가 FastMCP 툴을 사용하며 비즈니스 로직까지 분석합니다.
 
@@ -637,15 +1178,12 @@ async def analyze_error(request: ErrorRequest):
     8. 최종 결과 반환
     """
     try:
-        print("\n" + "="*80)
-        print("🚀 에러 분석 요청 시작")
-        print("="*80)
-        print(f"에러 타입: {request.error_type}")
-        print(f"에러 메시지: {request.error_message}")
-        print(f"스택 트레이스:\n{request.stack_trace}")
-        print(f"입력 파라미터: {request.input_params}")
-        print(f"서버 경로: {request.server_base_path}")
-        print("="*80)
+        log.info("🚀 에러 분석 요청 시작 - 타입: %s", request.error_type)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("에러 메시지: %s", request.error_message)
+            log.debug("스택 트레이스:\n%s", request.stack_trace)
+            log.debug("입력 파라미터: %s", request.input_params)
+            log.debug("서버 경로: %s", request.server_base_path)
 
         # 1. 스택 트레이스에서 파일 위치 추출
         file_locations = _extract_file_locations(
@@ -653,12 +1191,13 @@ async def analyze_error(request: ErrorRequest):
             request.server_base_path
         )
 
-        print(f"\n📍 추출된 파일 위치: {len(file_locations)}개")
-        for loc in file_locations:
-            print(f"  - {loc['file']}:{loc['line']}")
+        log.info("📍 추출된 파일 위치: %d개", len(file_locations))
+        if log.isEnabledFor(logging.DEBUG):
+            for loc in file_locations:
+                log.debug("  - %s:%s", loc['file'], loc['line'])
 
         if not file_locations:
-            print("❌ 스택 트레이스에서 파일 위치를 찾을 수 없습니다.")
+            log.info("❌ 스택 트레이스에서 파일 위치를 찾을 수 없습니다.")
             return {
                 "success": False,
                 "error": "스택 트레이스에서 파일 위치를 찾을 수 없습니다.",
@@ -669,10 +1208,10 @@ async def analyze_error(request: ErrorRequest):
         error_line = None
         if file_locations:
             error_line = file_locations[0].get('line')
-            print(f"🎯 에러 라인 번호: {error_line}")
+            log.info("🎯 에러 라인 번호: %s", error_line)
 
         # 2. AI 에이전트가 FastMCP 툴을 사용하며 분석
-        print("\n🤖 AI 에이전트 분석 시작...")
+        log.info("🤖 AI 에이전트 분석 시작...")
         result = await _analyze_with_ai_agent(
             error_type=request.error_type,
             error_message=request.error_message,
@@ -683,35 +1222,24 @@ async def analyze_error(request: ErrorRequest):
             server_base_path=request.server_base_path
         )
 
-        print(f"\n✅ 분석 완료!")
-        print(f"  - 툴 호출 횟수: {len(result['tool_calls'])}회")
-        print(f"  - 반복 횟수: {result['iterations']}회")
-
-        # 토큰 사용량 출력
-        if 'token_usage' in result:
-            token_info = result['token_usage']
-            print(f"\n{'='*60}")
-            print(f"📊 토큰 사용량")
-            print(f"{'='*60}")
-            print(f"  입력 토큰  : {token_info['input_tokens']:>10,}")
-            print(f"  출력 토큰  : {token_info['output_tokens']:>10,}")
-            print(f"  {'─'*56}")
-            print(f"  총 토큰    : {token_info['total_tokens']:>10,}")
-            print(f"{'='*60}")
-        print(f"\n📊 툴 호출 내역:")
-        for i, tc in enumerate(result['tool_calls'], 1):
-            args_str = str(tc['arguments'])
-            # error_line 사용 여부 표시
-            if tc['tool'] == 'read_file':
-                if 'error_line' in tc['arguments'] and tc['arguments']['error_line']:
-                    args_str += " ✅ (error_line 사용!)"
-                else:
-                    args_str += " ⚠️ (error_line 미사용 - 토큰 낭비!)"
-            print(f"  {i}. {tc['tool']}({args_str})")
-
-        print(f"\n📝 분석 결과:")
-        print(result["analysis"][:1000] + "..." if len(result["analysis"]) > 1000 else result["analysis"])
-        print("\n" + "="*80)
+        token_info = result['token_usage']
+        log.info(
+            "✅ 분석 완료 - 툴 호출 %d회, 반복 %d회, 토큰 %d (입력 %d / 출력 %d)%s",
+            len(result['tool_calls']), result['iterations'],
+            token_info['total_tokens'], token_info['input_tokens'], token_info['output_tokens'],
+            " [fast path]" if result.get("fast_path") else ""
+        )
+        if log.isEnabledFor(logging.DEBUG):
+            for i, tc in enumerate(result['tool_calls'], 1):
+                args_str = str(tc['arguments'])
+                # error_line 사용 여부 표시
+                if tc['tool'] == 'read_file':
+                    if tc['arguments'].get('error_line'):
+                        args_str += " ✅ (error_line 사용!)"
+                    else:
+                        args_str += " ⚠️ (error_line 미사용 - 토큰 낭비!)"
+                log.debug("  %d. 툴 호출 %s(%s)", i, tc['tool'], args_str)
+            log.debug("📝 분석 결과:\n%s", result["analysis"][:1000])
 
         return {
             "success": True,
@@ -719,18 +1247,82 @@ async def analyze_error(request: ErrorRequest):
             "analysis": result["analysis"],
             "tool_calls": result["tool_calls"],
             "iterations": result["iterations"],
+            "fast_path": result.get("fast_path", False),
             "using_fastmcp": True
         }
 
     except Exception as e:
-        print(f"\n❌ 에러 발생: {str(e)}")
-        print("="*80)
+        log.exception("❌ 에러 분석 실패")
         raise HTTPException(
             status_code=500,
             detail=f"에러 분석 중 문제 발생: {str(e)}"
         )
 
 
+def _sse(payload: dict) -> str:
+    """SSE data 프레임 인코딩"""
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+@app.post("/analyze/stream")
+async def analyze_error_stream(request: ErrorRequest):
+    """
+    AI 에이전트 분석 (SSE) - 반복/툴 호출 진행 상황과 응답 토큰을 생성되는 대로 전송합니다.
+
+    이벤트: start → (iteration | tool | token)* → done | error
+    """
+    file_locations = _extract_file_locations(
+        request.stack_trace,
+        request.server_base_path
+    )
+    if not file_locations:
+        return {
+            "success": False,
+            "error": "스택 트레이스에서 파일 위치를 찾을 수 없습니다.",
+            "analysis": None
+        }
+    error_line = file_locations[0].get('line')
+
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run_agent():
+        try:
+            result = await _analyze_with_ai_agent(
+                error_type=request.error_type,
+                error_message=request.error_message,
+                stack_trace=request.stack_trace,
+                file_locations=file_locations,
+                error_line=error_line,
+                input_params=request.input_params,
+                server_base_path=request.server_base_path,
+                on_event=events.put
+            )
+            await events.put({
+                "type": "done",
+                "analysis": result["analysis"],
+                "tool_calls": result["tool_calls"],
+                "iterations": result["iterations"],
+                "fast_path": result.get("fast_path", False)
+            })
+        except Exception as e:
+            await events.put({"type": "error", "detail": f"에러 분석 중 문제 발생: {str(e)}"})
+
+    async def event_stream():
+        task = asyncio.create_task(run_agent())
+        try:
+            yield _sse({"type": "start", "file_locations": file_locations})
+            while True:
+                event = await events.get()
+                yield _sse(event)
+                if event["type"] in ("done", "error"):
+                    break
+        finally:
+            # 클라이언트 연결이 끊기면 에이전트 루프도 중단
+            task.cancel()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 if __name__ == "__main__":
     import uvicorn
     print("🚀 Error Debugger API (Local Files) 시작")
@@ -738,4 +1330,10 @@ if __name__ == "__main__":
     print("   - 여러 파일을 읽으며 비즈니스 로직 분석")
     print("   - OpenAI GPT-4o")
     print("   - Port: 9001 (로컬 파일 버전)")
-    uvicorn.run(app, host="0.0.0.0", port=9001)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=9001,
+        loop="uvloop" if uvloop else "asyncio",
+        http="httptools"
+    )
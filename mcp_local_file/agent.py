@@ -1,12 +1,57 @@
 # agent.py
 import os
-from openai import OpenAI
+import re
+import sys
+import asyncio
+import operator
+import uuid
+from collections import OrderedDict
+import httpx
+from openai import AsyncOpenAI
 import json
+import base64
 from dotenv import load_dotenv
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# 비동기 클라이언트 - 한 턴의 여러 도구 호출(이미지 후속 분석 등)이 커넥션 풀을 공유하며 동시에 진행
+client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=httpx.AsyncClient(
+        timeout=60,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32)
+    )
+)
+
+# 도구 선택과 최종 답변 모두 같은 모델 사용 (이미지 처리와 동일) - FileAgent 기본 모델
+CHAT_MODEL = "gpt-4.1-mini"
+# 한 턴에서 도구 호출을 반복할 최대 횟수
+MAX_TOOL_ROUNDS = 5
+# AGENT_DEBUG=1이면 라운드마다 프롬프트/캐시 토큰 수 출력 (프롬프트 캐시 적중 확인용)
+AGENT_DEBUG = os.getenv("AGENT_DEBUG", "").lower() in ("1", "true", "yes")
+
+# 대화 히스토리가 이 길이를 넘으면 오래된 메시지를 요약 한 개로 압축
+HISTORY_MAX_MESSAGES = 20
+# 요청에 원문 그대로 보내는 최근 메시지 수 (요약 후에도 이만큼은 남김)
+HISTORY_KEEP_MESSAGES = 10
+SUMMARY_MODEL = "gpt-4o-mini"
+# 요약 입력에 넣을 메시지당 최대 글자 수 (파일 내용 같은 긴 도구 결과 절단)
+SUMMARY_MESSAGE_CHARS = 2000
+
+# 고정 시스템 프롬프트 - 모든 호출의 첫 메시지로 바이트 단위까지 동일하게 보내
+# 시스템 + 도구 스키마 prefix가 OpenAI 프롬프트 캐시에 적중하도록 함
+SYSTEM_PROMPT = """당신은 로컬 파일 시스템을 탐색하고 분석하는 AI 어시스턴트입니다.
+
+사용자가 파일이나 디렉토리에 대해 질문하면:
+1. 적절한 도구를 선택해서 사용하세요
+2. 결과를 분석해서 사용자에게 유용한 답변을 제공하세요
+3. 여러 도구를 조합해서 사용할 수도 있습니다
+
+주의사항:
+- 파일 경로는 정확해야 합니다
+- 보안을 위해 시스템 파일은 읽지 마세요
+- 사용자가 요청한 내용만 처리하세요"""
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
 
 # MCP 서버의 도구들을 OpenAI Function으로 변환
 TOOLS = [
@@ -163,16 +208,168 @@ TOOLS = [
     }
 ]
 
+# 의미 캐시 - 같은 파일/이미지에 대한 거의 같은 질문이면 (파일이 바뀌지 않은 한) 이전 답변 재사용
+EMBEDDING_MODEL = "text-embedding-3-small"
+SEMANTIC_CACHE_SIZE = 256
+# 코사인 유사도 기준 (OpenAI 임베딩은 정규화되어 있어 내적 = 코사인)
+SEMANTIC_CACHE_THRESHOLD = 0.95
+# 메시지에 나온 경로 후보 (확장자가 있거나 /가 들어간 토큰)
+_PATH_RE = re.compile(r'[\w.~/-]*/[\w.~/-]+|[\w~-][\w.~-]*\.\w+')
+
+
+def _referenced_mtimes(message: str) -> tuple:
+    """메시지에 나온 실제 파일/디렉토리 경로와 mtime - 파일이 바뀌면 캐시 키가 달라짐"""
+    mtimes = []
+    for path in _PATH_RE.findall(message):
+        try:
+            mtimes.append((path, os.stat(os.path.expanduser(path)).st_mtime_ns))
+        except OSError:
+            continue
+    return tuple(mtimes)
+
+
+class SemanticCache:
+    """질문 임베딩 유사도 기반 답변 캐시 (LRU)"""
+
+    def __init__(self, max_size: int = SEMANTIC_CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.max_size = max_size
+        self.threshold = threshold
+        self._entries = OrderedDict()  # 질문 → (임베딩, 경로 mtime, 답변)
+
+    async def lookup(self, message: str):
+        """
+        (캐시된 답변 또는 None, 저장용 키) 반환 - 파일 경로가 없는 질문은 대화 맥락에 의존하므로 캐시하지 않음 (None, None)
+        임베딩 호출이 실패해도 캐시는 선택 기능이므로 미스로 처리 (None, None)
+        """
+        mtimes = _referenced_mtimes(message)
+        if not mtimes:
+            return None, None
+
+        try:
+            response = await client.embeddings.create(model=EMBEDDING_MODEL, input=message)
+        except Exception as e:
+            print(f"\n⚠️ 의미 캐시 조회 실패: {str(e)}")
+            return None, None
+        embedding = response.data[0].embedding
+
+        best_key, best_score = None, self.threshold
+        for key, (cached_embedding, cached_mtimes, _) in self._entries.items():
+            if cached_mtimes != mtimes:
+                continue
+            score = sum(map(operator.mul, embedding, cached_embedding))
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            return None, (embedding, mtimes)
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key][2], (embedding, mtimes)
+
+    def store(self, message: str, cache_key, answer: str):
+        """lookup에서 받은 키로 답변 저장 (가장 오래 안 쓴 항목부터 제거)"""
+        if cache_key is None or not answer:
+            return
+        embedding, mtimes = cache_key
+        self._entries[message] = (embedding, mtimes, answer)
+        self._entries.move_to_end(message)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+# 모든 대화(FileAgent)가 공유
+semantic_cache = SemanticCache()
+
+
+async def _stream_completion(
+    messages: list,
+    tool_choice: str,
+    model: str,
+    prompt_cache_key: str,
+    on_token=None
+):
+    """
+    chat.completions를 stream=True로 호출해 델타를 조립합니다.
+    content 토큰은 도착하는 대로 on_token(text)으로 넘기고, (assistant 메시지 dict, usage)를 반환합니다.
+    """
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        tools=TOOLS,
+        tool_choice=tool_choice,
+        prompt_cache_key=prompt_cache_key,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+
+    content_parts = []
+    tool_calls = {}  # index → 조립 중인 tool_call
+    usage = None
+    async for chunk in stream:
+        if chunk.usage:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+            if on_token:
+                on_token(delta.content)
+        for tc in delta.tool_calls or []:
+            slot = tool_calls.setdefault(tc.index, {
+                "id": None,
+                "type": "function",
+                "function": {"name": "", "arguments": ""}
+            })
+            if tc.id:
+                slot["id"] = tc.id
+            if tc.function:
+                slot["function"]["name"] += tc.function.name or ""
+                slot["function"]["arguments"] += tc.function.arguments or ""
+
+    message = {"role": "assistant", "content": "".join(content_parts) or None}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+    return message, usage
+
+
+# 이 도구들은 같은 머신의 file_server를 직접 호출하므로 base64 대신 임시 파일 경로로 받음 (읽은 뒤 삭제)
+_IMAGE_FILE_TOOLS = frozenset({"analyze_image", "compare_images", "extract_text_from_image"})
+# 이미지 도구 결과의 "mime_type:임시파일경로" 부분 (| 로 구분)
+_TEMP_IMAGE_RE = re.compile(r'image/[\w.+-]+:([^|]+)')
+
+
+def _read_image_file(image_file: str) -> str:
+    """file_server가 넘긴 임시 JPEG를 base64로 읽기 (API 요청에 넣을 때 한 번만 인코딩)"""
+    with open(image_file, 'rb') as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+
+def _remove_temp_images(result: str):
+    """이미지 도구 결과에 들어 있는 임시 파일을 모두 삭제 (파싱/읽기 실패와 관계없이)"""
+    for image_file in _TEMP_IMAGE_RE.findall(result):
+        try:
+            os.unlink(image_file)
+        except OSError:
+            pass
+
+
 class FileAgent:
-    def __init__(self):
+    def __init__(self, model: str = CHAT_MODEL):
+        # 도구 선택/최종 답변 라운드 모두 이 모델 하나로 호출 (모델이 바뀌면 프롬프트 캐시 재사용 불가)
+        self.model = model
+        # 대화 세션마다 고정된 캐시 키 - 같은 세션의 요청이 같은 캐시로 라우팅되도록
+        self.prompt_cache_key = f"file-agent-{uuid.uuid4().hex}"
         self.conversation_history = []
+        # 압축된 이전 대화 요약 (HISTORY_MAX_MESSAGES 초과 시 갱신)
+        self.history_summary = None
         # MCP 서버 도구들을 실제 함수로 매핑
         from file_server import (
             read_file, list_directory, search_in_files, get_file_info,
             analyze_image, compare_images, extract_text_from_image,
             analyze_image_with_llava  # 🎯 LLaVA API 도구 추가
         )
-        self.tool_functions = {
+        tools = {
             "read_file": read_file,
             "list_directory": list_directory,
             "search_in_files": search_in_files,
@@ -182,34 +379,50 @@ class FileAgent:
             "extract_text_from_image": extract_text_from_image,
             "analyze_image_with_llava": analyze_image_with_llava  # 🎯 LLaVA API 도구 추가
         }
+        # FastMCP의 FunctionTool은 .fn 속성이 실제 함수 - 호출마다 확인하지 않도록 한 번만 풀어 둠
+        self.tool_functions = {
+            name: getattr(tool, "fn", tool) for name, tool in tools.items()
+        }
     
-    def _call_tool(self, function_name: str, function_args: dict) -> str:
-        """도구 실행 (이미지 처리 포함)"""
+    async def _call_tool(self, function_name: str, function_args: dict) -> str:
+        """도구 실행 (이미지 처리 포함) - 동기 도구의 파일/이미지 I/O는 워커 스레드에서 실행"""
         
-        result = self.tool_functions[function_name](**function_args)
+        tool_function = self.tool_functions[function_name]
+        if function_name in _IMAGE_FILE_TOOLS:
+            function_args = {**function_args, "return_file": True}
+        if asyncio.iscoroutinefunction(tool_function):
+            # async로 정의된 MCP 도구는 스레드 없이 이벤트 루프에서 바로 실행
+            result = await tool_function(**function_args)
+        else:
+            result = await asyncio.to_thread(tool_function, **function_args)
         
-        # 이미지 분석 결과 처리
-        if result.startswith("IMAGE_DATA:"):
-            return self._handle_image_analysis(result)
-        elif result.startswith("COMPARE_IMAGES:"):
-            return self._handle_image_comparison(result)
-        elif result.startswith("EXTRACT_TEXT:"):
-            return self._handle_text_extraction(result)
+        # 이미지 분석 결과 처리 - 임시 파일은 이 Agent가 소유하므로 처리 후 항상 삭제
+        try:
+            if result.startswith("IMAGE_FILE:"):
+                return await self._handle_image_analysis(result)
+            elif result.startswith("COMPARE_IMAGE_FILES:"):
+                return await self._handle_image_comparison(result)
+            elif result.startswith("EXTRACT_TEXT_FILE:"):
+                return await self._handle_text_extraction(result)
+        finally:
+            if result.startswith(("IMAGE_FILE:", "COMPARE_IMAGE_FILES:", "EXTRACT_TEXT_FILE:")):
+                _remove_temp_images(result)
         
         return result
     
-    def _handle_image_analysis(self, result: str) -> str:
+    async def _handle_image_analysis(self, result: str) -> str:
         """이미지 분석 처리"""
         try:
-            # 파싱: IMAGE_DATA:mime_type:base64_data|QUESTION:question
+            # 파싱: IMAGE_FILE:mime_type:file_path|QUESTION:question
             parts = result.split("|QUESTION:")
-            image_part = parts[0].replace("IMAGE_DATA:", "")
+            image_part = parts[0].replace("IMAGE_FILE:", "")
             question = parts[1] if len(parts) > 1 else "이 이미지에 무엇이 있나요?"
             
-            mime_type, image_data = image_part.split(":", 1)
+            mime_type, image_file = image_part.split(":", 1)
+            image_data = _read_image_file(image_file)
             
             # GPT-4o Vision 호출
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model="gpt-4.1-mini",  # 또는 "gpt-4o-mini"
                 messages=[
                     {
@@ -236,18 +449,20 @@ class FileAgent:
         except Exception as e:
             return f"이미지 분석 실패: {str(e)}"
     
-    def _handle_image_comparison(self, result: str) -> str:
+    async def _handle_image_comparison(self, result: str) -> str:
         """이미지 비교 처리"""
         try:
             parts = result.split("|")
-            image1_data = parts[0].replace("COMPARE_IMAGES:", "")
+            image1_data = parts[0].replace("COMPARE_IMAGE_FILES:", "")
             image2_data = parts[1]
             question = parts[2].replace("QUESTION:", "") if len(parts) > 2 else "차이점은?"
             
-            mime1, data1 = image1_data.split(":", 1)
-            mime2, data2 = image2_data.split(":", 1)
+            mime1, file1 = image1_data.split(":", 1)
+            mime2, file2 = image2_data.split(":", 1)
+            data1 = _read_image_file(file1)
+            data2 = _read_image_file(file2)
             
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model="gpt-4.1-mini",
                 messages=[
                     {
@@ -277,13 +492,14 @@ class FileAgent:
         except Exception as e:
             return f"이미지 비교 실패: {str(e)}"
     
-    def _handle_text_extraction(self, result: str) -> str:
+    async def _handle_text_extraction(self, result: str) -> str:
         """OCR 처리"""
         try:
-            parts = result.replace("EXTRACT_TEXT:", "").split(":", 1)
-            mime_type, image_data = parts
+            parts = result.replace("EXTRACT_TEXT_FILE:", "").split(":", 1)
+            mime_type, image_file = parts
+            image_data = _read_image_file(image_file)
             
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model="gpt-4.1-mini",
                 messages=[
                     {
@@ -310,8 +526,80 @@ class FileAgent:
         except Exception as e:
             return f"텍스트 추출 실패: {str(e)}"
         
-    def chat(self, user_message: str) -> str:
-        """사용자 메시지 처리"""
+    async def _run_tool_call(self, tool_call: dict) -> str:
+        """
+        tool_call 하나를 실행해 결과 문자열 반환
+        인자 파싱/도구 실행이 실패해도 예외 대신 에러 문자열을 돌려줘 모든 tool_calls에 tool 응답이 붙도록 함
+        """
+        function_name = tool_call["function"]["name"]
+        try:
+            function_args = json.loads(tool_call["function"]["arguments"] or "{}")
+        except json.JSONDecodeError as e:
+            print(f"\n⚠️ 도구 인자 파싱 실패: {function_name}")
+            return f"Error: 도구 인자 JSON 파싱 실패 ({function_name}): {str(e)}"
+
+        print(f"\n🔧 도구 사용: {function_name}")
+        print(f"   인자: {function_args}")
+        try:
+            return await self._call_tool(function_name, function_args)
+        except Exception as e:
+            return f"Error: 도구 실행 실패 ({function_name}): {str(e)}"
+
+    def _recent_start(self) -> int:
+        """
+        최근 HISTORY_KEEP_MESSAGES개가 시작되는 인덱스
+        tool 결과가 자기 tool_calls 없이 잘리지 않도록 user 메시지 경계까지 당김
+        """
+        history = self.conversation_history
+        start = max(len(history) - HISTORY_KEEP_MESSAGES, 0)
+        while start < len(history) and history[start]["role"] != "user":
+            start += 1
+        return start
+
+    def _context_messages(self) -> list:
+        """시스템 프롬프트 + (요약) + 최근 대화 - 시스템 프롬프트를 맨 앞에 고정해 프롬프트 캐시 유지"""
+        messages = [SYSTEM_MESSAGE]
+        if self.history_summary:
+            messages.append({"role": "system", "content": f"Prior context: {self.history_summary}"})
+        return messages + self.conversation_history[self._recent_start():]
+
+    async def _compact_history(self):
+        """히스토리가 길어지면 최근 메시지만 남기고 나머지는 gpt-4o-mini 요약 한 개로 대체"""
+        if len(self.conversation_history) <= HISTORY_MAX_MESSAGES:
+            return
+        start = self._recent_start()
+        old = self.conversation_history[:start]
+        if not old:
+            return
+
+        lines = [f"이전 요약: {self.history_summary}"] if self.history_summary else []
+        for message in old:
+            content = message.get("content") or ""
+            if message.get("tool_calls"):
+                names = ", ".join(tc["function"]["name"] for tc in message["tool_calls"])
+                content = f"{content} [도구 호출: {names}]".strip()
+            lines.append(f"{message['role']}: {content[:SUMMARY_MESSAGE_CHARS]}")
+
+        try:
+            response = await client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": "다음 대화를 이후 대화에 필요한 사실(파일 경로, 결과, 사용자 요청) 위주로 200토큰 이내로 요약하세요."},
+                    {"role": "user", "content": "\n".join(lines)}
+                ],
+                max_tokens=200
+            )
+        except Exception as e:
+            # 요약 실패 시 이번에는 압축하지 않음 (다음 턴에 다시 시도)
+            print(f"\n⚠️ 대화 요약 실패: {str(e)}")
+            return
+
+        self.history_summary = response.choices[0].message.content
+        del self.conversation_history[:start]
+        print(f"\n🗜️ 대화 히스토리 압축: 메시지 {len(old)}개 → 요약")
+
+    async def chat(self, user_message: str, on_token=None) -> str:
+        """사용자 메시지 처리 - on_token을 넘기면 답변 토큰을 도착하는 대로 전달"""
 
         # 대화 히스토리에 추가
         self.conversation_history.append({
@@ -319,91 +607,75 @@ class FileAgent:
             "content": user_message
         })
 
-        # 최근 5개만 유지 (토큰 절약)
-        recent_history = self.conversation_history[-10:]  # 최근 10개 (user+assistant 쌍 5개)
+        # 같은 파일에 대한 거의 같은 질문이면 LLM/도구 호출 없이 이전 답변 재사용
+        cached_answer, cache_key = await semantic_cache.lookup(user_message)
+        if cached_answer is not None:
+            print("\n♻️ 캐시된 답변 재사용")
+            self.conversation_history.append({
+                "role": "assistant",
+                "content": cached_answer
+            })
+            await self._compact_history()
+            return cached_answer
 
-        # OpenAI API 호출
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # gpt-4 대신 gpt-4o-mini 사용 (더 저렴하고 빠름)
-            messages=[
-                {
-                    "role": "system",
-                    "content": """당신은 로컬 파일 시스템을 탐색하고 분석하는 AI 어시스턴트입니다.
+        # 이전 대화는 요약 + 최근 10개만 (토큰 절약)
+        # 이번 턴의 도구 호출/결과는 messages에 이어 붙여 같은 컨텍스트로 다시 호출
+        messages = self._context_messages()
 
-사용자가 파일이나 디렉토리에 대해 질문하면:
-1. 적절한 도구를 선택해서 사용하세요
-2. 결과를 분석해서 사용자에게 유용한 답변을 제공하세요
-3. 여러 도구를 조합해서 사용할 수도 있습니다
+        for round_no in range(MAX_TOOL_ROUNDS + 1):
+            # 도구 호출이 더 필요 없을 때까지 같은 모델/같은 프롬프트로 반복
+            # (마지막 라운드는 도구 없이 답변만)
+            response_message, usage = await _stream_completion(
+                messages,
+                tool_choice="auto" if round_no < MAX_TOOL_ROUNDS else "none",
+                model=self.model,
+                prompt_cache_key=self.prompt_cache_key,
+                on_token=on_token
+            )
+
+            # 프롬프트 캐시 적중 확인 (캐시된 prefix 토큰 수) - 디버그 모드에서만
+            if AGENT_DEBUG and usage and usage.prompt_tokens_details:
+                print(f"\n📊 프롬프트 토큰: {usage.prompt_tokens} (캐시: {usage.prompt_tokens_details.cached_tokens})")
+
+            tool_calls = response_message.get("tool_calls")
+
+            # 도구 호출 없이 바로 답변
+            if not tool_calls:
+                self.conversation_history.append(response_message)
+                semantic_cache.store(user_message, cache_key, response_message["content"])
+                await self._compact_history()
+                return response_message["content"]
 
-주의사항:
-- 파일 경로는 정확해야 합니다
-- 보안을 위해 시스템 파일은 읽지 마세요
-- 사용자가 요청한 내용만 처리하세요"""
-                }
-            ] + recent_history,  # 전체 히스토리 대신 최근 것만!
-            tools=TOOLS,
-            tool_choice="auto"
-        )
-        
-        response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
-        
-        # 도구 호출이 필요한 경우
-        if tool_calls:
             # 어시스턴트 응답을 히스토리에 추가
+            messages.append(response_message)
             self.conversation_history.append(response_message)
-            
-            # 각 도구 호출 실행
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
-                
-                print(f"\n🔧 도구 사용: {function_name}")
-                print(f"   인자: {function_args}")
-                
-                # 도구 실행
-                # FunctionTool 객체는 .fn 속성으로 실제 함수에 접근
-                tool = self.tool_functions[function_name]
-                if hasattr(tool, 'fn'):
-                    # FastMCP의 FunctionTool인 경우
-                    function_response = tool.fn(**function_args)
-                else:
-                    # 일반 함수인 경우
-                    function_response = tool(**function_args)
-                
-                # 도구 결과를 히스토리에 추가
-                self.conversation_history.append({
-                    "tool_call_id": tool_call.id,
+
+            # 같은 턴의 도구 호출(및 이미지 후속 분석 호출)은 서로 독립적이므로 동시에 실행
+            # (실패한 호출은 자기 tool_call_id의 에러 결과가 되고 나머지 결과는 유지)
+            function_responses = await asyncio.gather(*[
+                self._run_tool_call(tool_call) for tool_call in tool_calls
+            ])
+
+            # 도구 결과를 히스토리에 추가 (tool_calls 순서 유지)
+            for tool_call, function_response in zip(tool_calls, function_responses):
+                tool_message = {
+                    "tool_call_id": tool_call["id"],
                     "role": "tool",
-                    "name": function_name,
+                    "name": tool_call["function"]["name"],
                     "content": function_response
-                })
-            
-            # 도구 결과를 포함해서 다시 GPT 호출
-            second_response = client.chat.completions.create(
-                model="gpt-4.1",
-                messages=[
-                    {"role": "system", "content": "당신은 로컬 파일 시스템을 탐색하는 AI 어시스턴트입니다."}
-                ] + self.conversation_history
-            )
-            
-            final_message = second_response.choices[0].message.content
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": final_message
-            })
-            
-            return final_message
-        
-        else:
-            # 도구 호출 없이 바로 답변
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": response_message.content
-            })
-            return response_message.content
+                }
+                messages.append(tool_message)
+                self.conversation_history.append(tool_message)
+
+
+async def chat_many(user_messages: list) -> list:
+    """서로 독립적인 여러 대화(사용자별 FileAgent)를 동시에 처리"""
+    return await asyncio.gather(*[
+        FileAgent().chat(message) for message in user_messages
+    ])
+
 
-def main():
+async def main():
     agent = FileAgent()
     
     print("=" * 60)
@@ -412,15 +684,32 @@ def main():
     print("로컬 파일을 읽고 검색할 수 있는 AI 어시스턴트입니다.")
     print("'quit' 또는 'exit'를 입력하면 종료됩니다.\n")
     
-    while True:
-        user_input = input("\n👤 You: ")
-        
-        if user_input.lower() in ['quit', 'exit']:
-            print("👋 안녕히 가세요!")
-            break
-        
-        response = agent.chat(user_input)
-        print(f"\n🤖 Agent: {response}")
+    try:
+        while True:
+            user_input = await asyncio.to_thread(input, "\n👤 You: ")
+            
+            if user_input.lower() in ['quit', 'exit']:
+                print("👋 안녕히 가세요!")
+                break
+            
+            # 답변 토큰을 도착하는 대로 출력 (첫 토큰에서 머리말 출력)
+            streamed = []
+
+            def write_token(token):
+                if not streamed:
+                    sys.stdout.write("\n🤖 Agent: ")
+                streamed.append(token)
+                sys.stdout.write(token)
+                sys.stdout.flush()
+
+            response = await agent.chat(user_input, on_token=write_token)
+            if streamed:
+                print()
+            else:
+                # 캐시된 답변은 스트리밍 없이 한 번에 출력
+                print(f"\n🤖 Agent: {response}")
+    finally:
+        await client.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
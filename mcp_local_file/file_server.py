@@ -1,11 +1,26 @@
 from fastmcp import FastMCP
 import os
+import datetime
 from pathlib import Path
 from typing import List
 from PIL import Image
 import io
+import re
+import base64
+import mmap
+import tempfile
+import functools
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import requests
 
+try:
+    # 선택 의존성 - 있으면 SIMD DFA 스캐너로 검색, 없으면 re로 검색
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
 mcp = FastMCP("Local File Server")
 
 @mcp.tool()
@@ -38,18 +53,134 @@ def list_directory(directory_path: str = ".") -> str:
         파일 및 폴더 목록
     """
     try:
-        items = os.listdir(directory_path)
-        result = []
-
-        for item in items:
-            full_path = os.path.join(directory_path, item)
-            item_type = "📁" if os.path.isdir(full_path) else "📄"
-            result.append(f"{item_type} {item}")
-        
-        return "\n".join(result)
+        # scandir의 DirEntry.is_dir()은 디렉토리 읽을 때 받은 d_type을 써서 항목별 stat()이 없음
+        with os.scandir(directory_path) as entries:
+            return "\n".join(
+                f"{'📁' if entry.is_dir() else '📄'} {entry.name}"
+                for entry in entries
+            )
     except Exception as e:
         return f"Error listing directory: {str(e)}"
     
+# search_in_files 최대 결과 수
+SEARCH_RESULT_LIMIT = 20
+# 이 수 이상의 후보 파일이 있을 때만 프로세스 풀로 병렬 검색 (적으면 풀 오버헤드가 더 큼)
+PARALLEL_SEARCH_MIN_FILES = 64
+# 워커 하나에 넘기는 파일 묶음 크기
+SEARCH_CHUNK_SIZE = 64
+# 검색 시 내려가지 않는 디렉토리 (숨김 디렉토리는 별도로 건너뜀)
+SEARCH_SKIP_DIRS = frozenset({"node_modules", "__pycache__", "venv", "dist", "build"})
+
+_search_pool = None
+
+
+def _get_search_pool() -> ProcessPoolExecutor:
+    """
+    검색용 프로세스 풀 (처음 필요할 때 한 번만 생성해 재사용)
+    stdio 전송/이벤트 루프 상태를 가진 서버 프로세스를 fork하지 않도록 spawn으로 워커 생성
+    """
+    global _search_pool
+    if _search_pool is None:
+        _search_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(_shutdown_search_pool)
+    return _search_pool
+
+
+def _shutdown_search_pool():
+    """서버 종료 시 대기 중인 검색은 취소하고 워커 정리"""
+    global _search_pool
+    if _search_pool is not None:
+        _search_pool.shutdown(wait=True, cancel_futures=True)
+        _search_pool = None
+
+
+@functools.lru_cache(maxsize=32)
+def _hyperscan_db(expression: bytes):
+    """검색 패턴별 Hyperscan DB (워커 프로세스마다 한 번만 컴파일)"""
+    db = hyperscan.Database()
+    db.compile(expressions=[expression], ids=[0], flags=[hyperscan.HS_FLAG_CASELESS])
+    return db
+
+
+def _scan_file(file_path: str, pattern: "re.Pattern", limit: int) -> list:
+    """mmap으로 파일을 매핑해 라인 객체를 만들지 않고 바이트 단위로 검색"""
+    hits = []
+    try:
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            line_num = 1
+            counted = 0  # line_num이 반영된 위치
+            next_line = 0  # 마지막으로 결과에 넣은 줄의 다음 줄 시작 (같은 줄 중복 방지)
+
+            def add_hit(offset: int) -> bool:
+                """offset이 속한 줄을 결과에 추가 - limit에 도달하면 True (검색 중단)"""
+                nonlocal line_num, counted, next_line
+                if offset < next_line:
+                    return False
+                line_start = m.rfind(b'\n', 0, offset) + 1
+                line_end = m.find(b'\n', offset)
+                if line_end == -1:
+                    line_end = len(m)
+                line_num += m[counted:line_start].count(b'\n')
+                counted = line_start
+                next_line = line_end + 1
+                line = m[line_start:line_end].decode('utf-8', errors='replace')
+                hits.append(f"{file_path}:{line_num} - {line.strip()}")
+                return len(hits) >= limit
+
+            # 빈 검색어는 hyperscan이 컴파일하지 않으므로 re로 (모든 줄이 매칭)
+            if hyperscan is not None and pattern.pattern:
+                # 매칭 끝 위치만 받으므로 마지막 바이트로 줄을 찾음 (검색어에 줄바꿈이 없어 같은 줄)
+                try:
+                    _hyperscan_db(pattern.pattern).scan(
+                        m, match_event_handler=lambda _id, _from, to, _flags, _ctx: add_hit(to - 1)
+                    )
+                except hyperscan.ScanTerminated:
+                    pass
+            else:
+                match = pattern.search(m)
+                # 같은 줄의 다른 매칭은 건너뛰고 다음 줄부터
+                # (빈 검색어는 파일 끝에서도 길이 0 매칭이 나오므로 끝에 닿으면 중단)
+                while match and match.start() < len(m) and not add_hit(match.start()):
+                    match = pattern.search(m, next_line)
+    except (OSError, ValueError):
+        # 읽을 수 없는 파일 / 빈 파일(mmap 불가)은 건너뜀
+        pass
+    return hits
+
+
+def _scan_files(file_paths: list, pattern: "re.Pattern", limit: int) -> list:
+    """파일 묶음 검색 (프로세스 풀 워커에서 실행) - limit개 모이면 중단"""
+    hits = []
+    for file_path in file_paths:
+        hits.extend(_scan_file(file_path, pattern, limit - len(hits)))
+        if len(hits) >= limit:
+            break
+    return hits
+
+
+def _walk_files(directory: str, file_extensions: List[str]):
+    """os.scandir로 하위 디렉토리를 내려가며 확장자가 맞는 파일 경로 생성 (DirEntry 타입 정보로 stat 생략)"""
+    # tuple을 넘기면 str.endswith가 C 레벨에서 한 번에 비교
+    extensions = tuple(file_extensions)
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                subdirs = []
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        # .git/.venv 같은 숨김 디렉토리와 의존성/빌드 산출물 디렉토리는 내려가지 않음
+                        if not entry.name.startswith(".") and entry.name not in SEARCH_SKIP_DIRS:
+                            subdirs.append(entry.path)
+                    elif entry.name.endswith(extensions):
+                        yield entry.path
+        except OSError:
+            continue
+        # os.walk와 같은 순서로 방문하도록 역순으로 쌓음
+        stack.extend(reversed(subdirs))
+
+
 @mcp.tool()
 def search_in_files(
     search_query: str, 
@@ -70,26 +201,29 @@ def search_in_files(
     if file_extensions is None:
         file_extensions = ['.txt', '.md', '.py', '.js', '.json']
     
-    results =[]
-
     try: 
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if any(file.endswith(ext) for ext in file_extensions):
-                    file_path = os.path.join(root, file)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            lines = f.readlines()
-                            for line_num, line in enumerate(lines, 1):
-                                if search_query.lower() in line.lower():
-                                    results.append(
-                                        f"{file_path}:{line_num} - {line.strip()}"
-                                    )
-                    except:
-                        continue
+        pattern = re.compile(re.escape(search_query.encode('utf-8')), re.IGNORECASE)
+        file_paths = list(_walk_files(directory, file_extensions))
+
+        if len(file_paths) < PARALLEL_SEARCH_MIN_FILES:
+            results = _scan_files(file_paths, pattern, SEARCH_RESULT_LIMIT)
+        else:
+            # 파일 묶음을 프로세스 풀에 나눠 검색하고, 순서대로 모으다 상위 결과가 차면 나머지는 취소
+            pool = _get_search_pool()
+            futures = [
+                pool.submit(_scan_files, file_paths[i:i + SEARCH_CHUNK_SIZE], pattern, SEARCH_RESULT_LIMIT)
+                for i in range(0, len(file_paths), SEARCH_CHUNK_SIZE)
+            ]
+            results = []
+            for future in futures:
+                results.extend(future.result())
+                if len(results) >= SEARCH_RESULT_LIMIT:
+                    break
+            for future in futures:
+                future.cancel()
         
         if results:
-            return "\n".join(results[:20])  # 상위 20개만
+            return "\n".join(results[:SEARCH_RESULT_LIMIT])  # 상위 20개만
         else:
             return f"'{search_query}'에 대한 검색 결과가 없습니다."
         
@@ -112,7 +246,6 @@ def get_file_info(file_path: str) -> str:
         stat = os.stat(file_path)
         size_kb = stat.st_size / 1024
 
-        import datetime
         created = datetime.datetime.fromtimestamp(stat.st_ctime)
         modified = datetime.datetime.fromtimestamp(stat.st_mtime)
 
@@ -126,21 +259,96 @@ def get_file_info(file_path: str) -> str:
         return info
     except Exception as e:
         return f"Error getting file info: {str(e)}"
-    
-import base64
-from pathlib import Path
+
+
+def _resize_to_jpeg(image_path: str, max_size: int = 512, quality: int = 85) -> bytes:
+    """이미지를 최대 max_size로 줄여 JPEG 바이트로 변환 (토큰 절약)"""
+    img = Image.open(image_path)
+
+    # JPEG는 디코딩 단계(DCT)에서 1/2~1/8로 줄여서 읽음 - 원본 해상도 전체를 디코딩하지 않음
+    # (JPEG가 아니면 아무 동작도 하지 않음)
+    img.draft('RGB', (max_size, max_size))
+
+    # 최대 크기 제한 (512x512) - draft로 이미 2배 이내로 줄었으므로 BILINEAR로 충분
+    if img.width > max_size or img.height > max_size:
+        img.thumbnail((max_size, max_size), Image.Resampling.BILINEAR)
+
+    # JPEG로 변환 (용량 감소)
+    buffer = io.BytesIO()
+    img.convert('RGB').save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+@functools.lru_cache(maxsize=128)
+def _resize_to_jpeg_cached(image_path: str, mtime_ns: int, max_size: int, quality: int) -> bytes:
+    """(경로, mtime, 크기, 품질) 키로 리사이즈 결과 캐시 - 파일이 바뀌면 키가 달라져 다시 인코딩"""
+    return _resize_to_jpeg(image_path, max_size, quality)
+
+
+def _encode_image(image_path: str, max_size: int = 512, quality: int = 85) -> bytes:
+    """리사이즈한 JPEG 바이트 (Agent가 같은 이미지를 반복해서 여는 경우 캐시 재사용)"""
+    st = os.stat(image_path)
+    return _resize_to_jpeg_cached(image_path, st.st_mtime_ns, max_size, quality)
+
+
+def _write_temp_jpeg(image_path: str, jpeg_bytes: bytes = None) -> str:
+    """
+    리사이즈한 JPEG를 임시 파일로 쓰고 경로를 반환합니다.
+    return_file=True로 요청한 호출자(같은 머신의 Agent)만 사용하며, 읽은 뒤 직접 삭제해야 합니다.
+    """
+    if jpeg_bytes is None:
+        jpeg_bytes = _encode_image(image_path)
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+        tmp.write(jpeg_bytes)
+    return tmp.name
+
+
+def _image_payloads(image_paths: List[str], return_file: bool) -> List[str]:
+    """
+    이미지마다 "image/jpeg:<base64>" (기본) 또는 "image/jpeg:<임시 파일 경로>" (return_file) 반환
+    같은 경로는 한 번만 인코딩하고, 서로 다른 이미지는 동시에 인코딩 (PIL은 디코딩/인코딩 중 GIL 해제)
+    """
+    unique_paths = list(dict.fromkeys(image_paths))
+    if len(unique_paths) == 1:
+        encoded = {unique_paths[0]: _encode_image(unique_paths[0])}
+    else:
+        with ThreadPoolExecutor(max_workers=len(unique_paths)) as executor:
+            encoded = dict(zip(unique_paths, executor.map(_encode_image, unique_paths)))
+
+    if not return_file:
+        return [f"image/jpeg:{base64.b64encode(encoded[path]).decode('utf-8')}" for path in image_paths]
+
+    # 호출자가 읽은 뒤 각각 삭제하므로 임시 파일은 이미지마다 따로
+    # (중간에 쓰기가 실패하면 이미 만든 파일은 여기서 삭제)
+    temp_files = []
+    try:
+        for path in image_paths:
+            temp_files.append(_write_temp_jpeg(path, encoded[path]))
+    except Exception:
+        for temp_file in temp_files:
+            os.unlink(temp_file)
+        raise
+    return [f"image/jpeg:{temp_file}" for temp_file in temp_files]
+
 
 @mcp.tool()
-def analyze_image(image_path: str, question: str = "이 이미지에 무엇이 있나요?") -> str:
+def analyze_image(
+    image_path: str,
+    question: str = "이 이미지에 무엇이 있나요?",
+    return_file: bool = False
+) -> str:
     """
     이미지를 분석합니다.
     
     Args:
         image_path: 이미지 파일 경로 (.jpg, .jpeg, .png, .gif, .webp)
         question: 이미지에 대해 물어볼 질문
+        return_file: True면 base64 대신 서버 로컬 임시 JPEG 경로를 반환
+            (같은 머신의 호출자 전용 - 읽은 뒤 직접 삭제해야 함)
     
     Returns:
-        이미지 분석 결과
+        IMAGE_DATA:image/jpeg:<base64>|QUESTION:<질문>
+        (return_file이면 IMAGE_FILE:image/jpeg:<임시 JPEG 경로>|QUESTION:<질문>)
     """
     try:
         # 파일 확장자 확인
@@ -156,30 +364,21 @@ def analyze_image(image_path: str, question: str = "이 이미지에 무엇이 
         if ext not in mime_types:
             return f"지원하지 않는 이미지 형식입니다: {ext}"
 
-        mime_type = mime_types[ext]
-
-        # 이미지 리사이징 (토큰 절약)
-        img = Image.open(image_path)
-
-        # 최대 크기 제한 (512x512)
-        max_size = 512
-        if img.width > max_size or img.height > max_size:
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-
-        # JPEG로 변환 (용량 감소)
-        buffer = io.BytesIO()
-        img.convert('RGB').save(buffer, format='JPEG', quality=85)
-        image_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        mime_type = 'image/jpeg'
-
-        # 이미지 정보와 질문을 반환 (Agent에서 GPT-4o Vision으로 처리)
-        return f"IMAGE_DATA:{mime_type}:{image_data}|QUESTION:{question}"
+        # 리사이즈한 JPEG와 질문을 반환 (Agent에서 GPT-4o Vision으로 처리)
+        prefix = "IMAGE_FILE" if return_file else "IMAGE_DATA"
+        image_data = _image_payloads([image_path], return_file)[0]
+        return f"{prefix}:{image_data}|QUESTION:{question}"
         
     except Exception as e:
         return f"Error analyzing image: {str(e)}"
 
 @mcp.tool()
-def compare_images(image_path1: str, image_path2: str, question: str = "이 두 이미지의 차이점은?") -> str:
+def compare_images(
+    image_path1: str,
+    image_path2: str,
+    question: str = "이 두 이미지의 차이점은?",
+    return_file: bool = False
+) -> str:
     """
     두 이미지를 비교합니다.
     
@@ -187,60 +386,38 @@ def compare_images(image_path1: str, image_path2: str, question: str = "이 두
         image_path1: 첫 번째 이미지 경로
         image_path2: 두 번째 이미지 경로
         question: 비교에 대한 질문
+        return_file: True면 base64 대신 서버 로컬 임시 JPEG 경로 두 개를 반환
+            (같은 머신의 호출자 전용 - 읽은 뒤 직접 삭제해야 함)
     
     Returns:
-        비교 결과
+        COMPARE_IMAGES:image/jpeg:<base64>|image/jpeg:<base64>|QUESTION:<질문>
+        (return_file이면 COMPARE_IMAGE_FILES:image/jpeg:<경로1>|image/jpeg:<경로2>|QUESTION:<질문>)
     """
     try:
-        images_data = []
-        for path in [image_path1, image_path2]:
-            # 이미지 리사이징 (토큰 절약)
-            img = Image.open(path)
-
-            # 최대 크기 제한 (512x512)
-            max_size = 512
-            if img.width > max_size or img.height > max_size:
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-
-            # JPEG로 변환
-            buffer = io.BytesIO()
-            img.convert('RGB').save(buffer, format='JPEG', quality=85)
-            image_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            mime_type = 'image/jpeg'
-            images_data.append(f"{mime_type}:{image_data}")
-
-        return f"COMPARE_IMAGES:{images_data[0]}|{images_data[1]}|QUESTION:{question}"
+        prefix = "COMPARE_IMAGE_FILES" if return_file else "COMPARE_IMAGES"
+        images_data = _image_payloads([image_path1, image_path2], return_file)
+        return f"{prefix}:{images_data[0]}|{images_data[1]}|QUESTION:{question}"
         
     except Exception as e:
         return f"Error comparing images: {str(e)}"
 
 @mcp.tool()
-def extract_text_from_image(image_path: str) -> str:
+def extract_text_from_image(image_path: str, return_file: bool = False) -> str:
     """
     이미지에서 텍스트를 추출합니다 (OCR).
     
     Args:
         image_path: 이미지 파일 경로
+        return_file: True면 base64 대신 서버 로컬 임시 JPEG 경로를 반환
+            (같은 머신의 호출자 전용 - 읽은 뒤 직접 삭제해야 함)
     
     Returns:
-        추출된 텍스트
+        EXTRACT_TEXT:image/jpeg:<base64>
+        (return_file이면 EXTRACT_TEXT_FILE:image/jpeg:<임시 JPEG 경로>)
     """
     try:
-        # 이미지 리사이징 (토큰 절약)
-        img = Image.open(image_path)
-
-        # 최대 크기 제한 (512x512)
-        max_size = 512
-        if img.width > max_size or img.height > max_size:
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-
-        # JPEG로 변환
-        buffer = io.BytesIO()
-        img.convert('RGB').save(buffer, format='JPEG', quality=85)
-        image_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        mime_type = 'image/jpeg'
-
-        return f"EXTRACT_TEXT:{mime_type}:{image_data}"
+        prefix = "EXTRACT_TEXT_FILE" if return_file else "EXTRACT_TEXT"
+        return f"{prefix}:{_image_payloads([image_path], return_file)[0]}"
         
     except Exception as e:
         return f"Error extracting text: {str(e)}"
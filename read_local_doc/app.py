@@ -1,6 +1,7 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from pathlib import Path
+import asyncio
 import os
 from typing import List
 from dotenv import load_dotenv
@@ -28,11 +29,17 @@ llm = ChatOpenAI(
     temperature=0.7
 )
 
+# query_file 엔드포인트가 이벤트 루프를 막지 않도록 비동기 클라이언트 사용
+async_client = openai.AsyncOpenAI()
+
+# query_file이 읽을 수 있는 최상위 디렉토리 (경로 탈출 방지)
+ALLOWED_ROOT = Path(os.getenv("DOC_ROOT", ".")).resolve()
+
 # 2. 로컬 파일 다루기
 @app.get("/list_files")
 def list_files(directory: str = "."):
-    p = Path(directory)
-    return [str(x) for x in p.iterdir()]
+    with os.scandir(directory) as entries:
+        return [entry.path for entry in entries]
     
 @app.get("/read_file")
 def read_file(path: str):
@@ -51,22 +58,26 @@ class GenerateRequest(BaseModel):
     text: str
 
 @app.post("/query_file")
-def query_file(req: QueryRequest):
-    collected_texts = []
-
-    # 1. 로컬 파일 읽기
+async def query_file(req: QueryRequest):
+    # 1. 로컬 파일 확인 (ALLOWED_ROOT 밖의 경로는 거부)
+    paths = []
     for path in req.file_paths:
-        if not os.path.exists(path):
+        p = Path(path).resolve()
+        if not p.is_relative_to(ALLOWED_ROOT):
+            raise HTTPException(status_code=403, detail=f"Access denied: {path}")
+        if not p.exists():
             raise HTTPException(status_code=404, detail=f"File not found: {path}")
-        with open(path, "r", encoding="latin1") as f:
-            collected_texts.append(f.read())
+        paths.append(p)
 
-    # 2. 모든 파일 내용을 하나의 문자열로 합치기
-    context = "/n".join(collected_texts)
+    # 2. 모든 파일을 스레드에서 동시에 읽어 하나의 문자열로 합치기
+    collected_texts = await asyncio.gather(
+        *(asyncio.to_thread(p.read_text, encoding="latin1") for p in paths)
+    )
+    context = "\n".join(collected_texts)
 
     # 3. OpenAI GPT에게 질문 + 문서 context 입력
     try:
-        response = openai.chat.completions.create(
+        response = await async_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided documents."},
@@ -1,23 +1,47 @@
+import functools
 import torch
 from PIL import Image
 from transformers import LlavaForConditionalGeneration, AutoProcessor
+from transformers.utils import is_flash_attn_2_available
 
 model_id = "llava-hf/llava-1.5-7b-hf"
 
-processor = AutoProcessor.from_pretrained(model_id)
-model = LlavaForConditionalGeneration.from_pretrained(
-    model_id,
-    torch_dtype=torch.float16,
-    device_map="auto"
-)
+# Ampere 이상 GPU는 BF16, 그 외(구형 GPU/MPS)는 FP16
+dtype = torch.bfloat16 if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else torch.float16
 
-# 이미지 파일명 수정 (cat.16.jpg -> cat.17.jpg)
-image = Image.open("cat.17.jpg").convert("RGB")
+# 이미지 패치 토큰(장당 576개) prefill용 fused attention - flash-attn 설치 시 FA2, 없으면 PyTorch SDPA
+attn_implementation = "flash_attention_2" if is_flash_attn_2_available() else "sdpa"
 
-# LLaVA 모델용 프롬프트 형식
-prompt = "USER: <image>\n이 이미지에 고양이가 있나요? 있다면 무슨 색인가요?\nASSISTANT:"
-inputs = processor(text=prompt, images=image, return_tensors="pt").to(model.device)
 
-output = model.generate(**inputs, max_new_tokens=100)
-answer = processor.decode(output[0], skip_special_tokens=True)
-print(answer)
+@functools.lru_cache(maxsize=1)
+def get_llava():
+    """프로세서와 모델을 한 번만 로드해서 재사용 (대화형 사용 시 매 질문마다 7B 로딩 방지)"""
+    processor = AutoProcessor.from_pretrained(model_id)
+    model = LlavaForConditionalGeneration.from_pretrained(
+        model_id,
+        torch_dtype=dtype,
+        device_map="auto",
+        attn_implementation=attn_implementation
+    ).eval()
+    model.generation_config.use_cache = True
+    print(f"⚡ attention: {model.config._attn_implementation}")
+    return processor, model
+
+
+def ask(image, question, max_new_tokens=100):
+    processor, model = get_llava()
+
+    # LLaVA 모델용 프롬프트 형식
+    prompt = f"USER: <image>\n{question}\nASSISTANT:"
+    inputs = processor(text=prompt, images=image, return_tensors="pt").to(model.device, dtype)
+
+    # 추론 전용 모드(autograd 기록 없음) + greedy 디코딩으로 KV 캐시만 사용
+    with torch.inference_mode():
+        output = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False, num_beams=1)
+    return processor.decode(output[0], skip_special_tokens=True)
+
+
+if __name__ == "__main__":
+    # 이미지 파일명 수정 (cat.16.jpg -> cat.17.jpg)
+    image = Image.open("cat.17.jpg").convert("RGB")
+    print(ask(image, "이 이미지에 고양이가 있나요? 있다면 무슨 색인가요?"))
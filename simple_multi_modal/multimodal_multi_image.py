@@ -1,37 +1,78 @@
+import functools
+import numpy as np
 import torch
+import torch.nn.functional as F
 from PIL import Image
 from transformers import LlavaForConditionalGeneration, AutoProcessor
+from transformers.utils import is_flash_attn_2_available
 
 # 모델 ID
 model_id = "llava-hf/llava-1.5-7b-hf"
 
-# Processor & model load
-processor = AutoProcessor.from_pretrained(model_id)
-model = LlavaForConditionalGeneration.from_pretrained(
-    model_id,
-    torch_dtype=torch.float16,
-    device_map="auto"
-)
-
-# 이미지 여러 장 불러오기
-image_files = ["cat.26.jpg","dog.996.jpg"]
-images = []
-
-for f in image_files:
-    img = Image.open(f).convert("RGB")
-    img = img.resize((224, 224))  # 가로 512, 세로 512로 축소
-    images.append(img)
-
-# LLaVA 모델용 프롬프트
-prompt = """USER: <image><image>
+# Ampere 이상 GPU는 BF16, 그 외(구형 GPU/MPS)는 FP16
+dtype = torch.bfloat16 if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else torch.float16
+
+# 이미지 패치 토큰(장당 576개) prefill용 fused attention - flash-attn 설치 시 FA2, 없으면 PyTorch SDPA
+attn_implementation = "flash_attention_2" if is_flash_attn_2_available() else "sdpa"
+
+
+@functools.lru_cache(maxsize=1)
+def get_llava():
+    """Processor & model을 한 번만 로드해서 재사용"""
+    processor = AutoProcessor.from_pretrained(model_id)
+    model = LlavaForConditionalGeneration.from_pretrained(
+        model_id,
+        torch_dtype=dtype,
+        device_map="auto",
+        attn_implementation=attn_implementation
+    ).eval()
+    model.generation_config.use_cache = True
+    print(f"⚡ attention: {model.config._attn_implementation}")
+    return processor, model
+
+
+def load_images(image_files, size=(224, 224)):
+    """이미지들을 한 번에 size로 축소해 uint8 NCHW 배치 텐서로 반환"""
+    arrays = []
+    for f in image_files:
+        img = Image.open(f)
+        img.draft("RGB", size)  # JPEG는 DCT 단계에서 미리 축소 디코딩
+        arrays.append(np.asarray(img.convert("RGB")))
+
+    # 원본 크기가 모두 같으면 한 번의 interpolate로 처리, 다르면 장별로 축소 후 쌓기
+    if len({a.shape for a in arrays}) == 1:
+        groups = [torch.from_numpy(np.stack(arrays))]
+    else:
+        groups = [torch.from_numpy(a)[None] for a in arrays]
+    resized = [
+        F.interpolate(g.permute(0, 3, 1, 2).float(), size=size, mode="bilinear", align_corners=False, antialias=True)
+        for g in groups
+    ]
+    return torch.cat(resized).round().clamp(0, 255).to(torch.uint8)
+
+
+def main():
+    processor, model = get_llava()
+
+    # 이미지 여러 장 불러와서 (N, 3, 224, 224) 배치 하나로 축소
+    image_files = ["cat.26.jpg","dog.996.jpg"]
+    images = load_images(image_files)
+
+    # LLaVA 모델용 프롬프트
+    prompt = """USER: <image><image>
 이 이미지들에 어떤 동물들이 있나요? 동물의 종류를 알려주세요
 ASSISTANT:"""
 
-# Processor에 텍스트 + 이미지 입력
-inputs = processor(text=prompt, images=images, return_tensors="pt").to(model.device)
+    # Processor에 텍스트 + 이미지 입력
+    inputs = processor(text=prompt, images=images, return_tensors="pt").to(model.device, dtype)
+
+    # 답변 생성 (추론 전용 모드 + greedy 디코딩)
+    with torch.inference_mode():
+        output = model.generate(**inputs, max_new_tokens=200, do_sample=False, num_beams=1)
+    answer = processor.decode(output[0], skip_special_tokens=True)
+
+    print(answer)
 
-# 답변 생성
-output = model.generate(**inputs, max_new_tokens=200)
-answer = processor.decode(output[0], skip_special_tokens=True)
 
-print(answer)
\ No newline at end of file
+if __name__ == "__main__":
+    main()